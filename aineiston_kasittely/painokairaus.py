@@ -2,9 +2,17 @@ import os
 import re
 import sys
 import glob
+import argparse
+import json
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.collections import LineCollection
+from matplotlib.transforms import offset_copy
 import kairauksen_paattyminen
 
 def resolve_input_dir():
@@ -69,17 +77,34 @@ def parse_termination_code(line: str):
     m = re.match(r"^\s*-\s*1\s*[,;:]?\s*([A-Za-zÅÄÖåäö]{1,3})\b", s, flags=re.IGNORECASE)
     return m.group(1).upper() if m else None
 
-def parse_tek_file(file_path, project_number, point_number):
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+SOUNDING_TYPES = ("PA",)
+
+def _pad_columns(d):
+    max_len = max(len(d["depth"]), len(d["weight"]), len(d["half_turns"]), len(d["soil_type"])) if d["depth"] else 0
+    for key in ["depth", "weight", "half_turns", "soil_type"]:
+        while len(d[key]) < max_len:
+            d[key].append("-" if key == "soil_type" else 0)
+    return d
 
-    d = {
+def _empty_sounding(tyonro="-", org="-"):
+    return {
         "depth": [], "weight": [], "half_turns": [], "soil_type": [],
         "Y": None, "X": None, "Z": None, "date": None, "point": None,
-        "termination_type": "-", "Or": "-", "Tyonro": "-"
+        "termination_type": "-", "Or": org, "Tyonro": tyonro
     }
-    capture_project = False
-    capture_point = False
+
+def _parse_sounding_block(block, lines):
+    """Kairauspisteen rivit (XY-rivin jälkeen) parse_tek_file-muotoon päättymiskoodiin asti."""
+    d = _empty_sounding(block["tyonro"], block["or"])
+    parts = block["xy"].split()
+    try:
+        d["Y"] = float(parts[1].replace(",", "."))
+        d["X"] = float(parts[2].replace(",", "."))
+        d["Z"] = float(parts[3].replace(",", "."))
+    except ValueError:
+        pass
+    d["date"] = parts[4]
+    d["point"] = parts[5]
     current_soil_type = "-"
 
     for raw in lines:
@@ -87,43 +112,18 @@ def parse_tek_file(file_path, project_number, point_number):
         if not line:
             continue
 
-        if line.startswith("TY"):
-            capture_project = (project_number in line)
-            d["Tyonro"] = line[2:].strip() or project_number
-            if not capture_project:
-                capture_point = False
-            continue
-
-        if capture_project and (line.startswith("OR") or line.startswith("Or")):
+        if line.startswith("OR") or line.startswith("Or"):
             parts = line.split()
             if len(parts) >= 2:
                 d["Or"] = parts[1]
             continue
 
-        if capture_project and line.startswith("XY"):
-            parts = line.split()
-            if len(parts) >= 6:
-                try:
-                    d["Y"] = float(parts[1].replace(",", "."))
-                    d["X"] = float(parts[2].replace(",", "."))
-                    d["Z"] = float(parts[3].replace(",", "."))
-                except ValueError:
-                    pass
-                d["date"] = parts[4]
-                d["point"] = parts[5]
-                capture_point = (d["point"] == point_number)
-            else:
-                capture_point = False
-            continue
-
-        if not (capture_project and capture_point):
-            continue
-
         code = parse_termination_code(line)
         if code:
             d["termination_type"] = code
             break
 
+        # AL-rivin pelkkä alkusyvyys jää depth-listaan; _pad_columns täydentää muut
         if line.startswith("AL") or line[0].isdigit() or (line[0] == "-" and len(line) > 1 and line[1].isdigit()):
             parts = line.split()
             tokens = parts[1:] if parts[0] == "AL" else parts
@@ -137,39 +137,160 @@ def parse_tek_file(file_path, project_number, point_number):
             except (ValueError, IndexError):
                 continue
 
-    max_len = max(len(d["depth"]), len(d["weight"]), len(d["half_turns"]), len(d["soil_type"])) if d["depth"] else 0
-    for key in ["depth", "weight", "half_turns", "soil_type"]:
-        while len(d[key]) < max_len:
-            d[key].append("-" if key == "soil_type" else 0)
+    return _pad_columns(d)
 
-    return d
+def _tek_index_path(file_path):
+    return file_path + ".tidx.json"
+
+def _tek_source_stamp(file_path):
+    st = os.stat(file_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def build_tek_index(file_path):
+    """
+    Käy TEK-tiedoston läpi kerran ja tallentaa jokaisen kairauspisteen
+    (XY-lohkon) tavusijainnin, pituuden sekä lohkoon vaikuttavat TY-, Or- ja
+    TT-rivit sivutiedostoon <tiedosto>.tidx.json.
+    """
+    blocks = []
+    tyonro, ty_line, org, method = "-", None, "-", None
+    block = None
+    offset = 0
+    with open(file_path, "rb") as f:
+        for raw in f:
+            line = raw.decode("utf-8").strip()
+            line_start, offset = offset, offset + len(raw)
+            if line.startswith("TY") or line.startswith("XY"):
+                if block is not None:
+                    block["length"] = line_start - block["offset"]
+                    blocks.append(block)
+                    block = None
+            if line.startswith("TY"):
+                ty_line = line
+                tyonro = line[2:].strip() or "-"
+                method = None
+            elif line.startswith("OR") or line.startswith("Or"):
+                parts = line.split()
+                if len(parts) >= 2:
+                    org = parts[1]
+            elif line.startswith("TT"):
+                parts = line.split()
+                method = parts[1].upper() if len(parts) >= 2 else None
+            elif line.startswith("XY"):
+                parts = line.split()
+                if ty_line is not None and len(parts) >= 6:
+                    block = {"offset": offset, "ty": ty_line, "tyonro": tyonro, "or": org,
+                             "type": method, "point": parts[5], "xy": line}
+    if block is not None:
+        block["length"] = offset - block["offset"]
+        blocks.append(block)
+
+    meta = {"source": _tek_source_stamp(file_path), "blocks": blocks}
+    index_path = _tek_index_path(file_path)
+    tmp = None
+    try:
+        # Oma väliaikaistiedosto jokaiselle kirjoittajalle (rinnakkaiset prosessit)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(index_path) or ".",
+                                         prefix=os.path.basename(index_path) + ".", suffix=".tmp",
+                                         delete=False) as f:
+            tmp = f.name
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, index_path)
+    except OSError as e:
+        print(f"[WARN] TEK-indeksiä ei voitu tallentaa ({index_path}): {e}")
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+    return meta
+
+# Prosessin sisäinen välimuisti ladatuille indekseille: polku -> meta
+_TEK_INDEXES = {}
+
+def load_tek_index(file_path):
+    """Palauttaa TEK-tiedoston indeksin; se rakennetaan uudelleen, jos tiedoston koko tai muokkausaika on muuttunut."""
+    meta = _TEK_INDEXES.get(file_path)
+    if meta is not None and meta["source"] == _tek_source_stamp(file_path):
+        return meta
+    try:
+        with open(_tek_index_path(file_path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta is None or meta.get("source") != _tek_source_stamp(file_path):
+        meta = build_tek_index(file_path)
+    if "lookup" not in meta:
+        # (työnro, piste) -> ensimmäinen lohko; vain muistissa
+        meta["lookup"] = {}
+        for i, block in enumerate(meta["blocks"]):
+            meta["lookup"].setdefault((block["tyonro"], block["point"]), i)
+    _TEK_INDEXES[file_path] = meta
+    return meta
+
+def find_tek_block(meta, project_number, point_number):
+    """Pisteen ensimmäinen lohko. Työnumeroa verrataan ensin tarkasti, sitten TY-rivin osana kuten ennen."""
+    i = meta["lookup"].get((project_number, point_number))
+    if i is not None:
+        return meta["blocks"][i]
+    for block in meta["blocks"]:
+        if block["point"] == point_number and project_number in block["ty"]:
+            return block
+    return None
+
+def read_tek_block(file_path, block, f=None):
+    """Lukee ja jäsentää yhden kairauspisteen lohkon suoraan sen tavusijainnista."""
+    if f is None:
+        with open(file_path, "rb") as f:
+            return read_tek_block(file_path, block, f)
+    f.seek(block["offset"])
+    data = f.read(block["length"]).decode("utf-8")
+    return _parse_sounding_block(block, data.splitlines())
+
+def parse_tek_file(file_path, project_number, point_number):
+    meta = load_tek_index(file_path)
+    block = find_tek_block(meta, project_number, point_number)
+    if block is None:
+        return _empty_sounding(project_number)
+    return read_tek_block(file_path, block)
+
+def iter_tek_soundings(file_path, sounding_types=SOUNDING_TYPES):
+    """
+    Palauttaa TEK-tiedoston kairauspisteet parse_tek_file-muodossa
+    indeksin järjestyksessä. sounding_types rajaa tutkimustavat TT-rivin
+    mukaan (oletuksena painokairaus "PA"); None palauttaa kaikki.
+    """
+    meta = load_tek_index(file_path)
+    with open(file_path, "rb") as f:
+        for block in meta["blocks"]:
+            if sounding_types is None or block["type"] in sounding_types:
+                yield read_tek_block(file_path, block, f)
 
 def list_projects_and_points(file_path):
     projects = {}
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    current_project = None
-    for line in lines:
-        if line.startswith("TY"):
-            current_project = line.strip()
-            projects[current_project] = []
-        if line.startswith("XY") and current_project:
-            projects[current_project].append(line.strip())
+    for block in load_tek_index(file_path)["blocks"]:
+        projects.setdefault(block["ty"], []).append(block["xy"])
     return projects
 
-def create_m_with_shorter_middle(ax, x_left, x_right, y_bottom, y_top):
+def m_glyph_vertices(x_left, x_right, y_bottom, y_top):
+    """Moreenin "M"-merkin viiden pisteen murtoviivat; y_bottom ja y_top voivat olla taulukoita -> (n, 5, 2)."""
+    y_bottom = np.atleast_1d(np.asarray(y_bottom, dtype=float))
+    y_top = np.atleast_1d(np.asarray(y_top, dtype=float))
     width = x_right - x_left
     m_width_scale = 0.6
     m_height_scale = 0.6
     middle_valley_scale = 0.8
-    m_points = [
-        (x_left + width * (1 - m_width_scale) / 2, y_top - (y_top - y_bottom) * (1 - m_height_scale)),
-        (x_left + width * (1 - m_width_scale) / 2 + width * m_width_scale * 0.3, y_bottom),
-        (x_left + width * (1 - m_width_scale) / 2 + width * m_width_scale * 0.5, y_bottom + (y_top - y_bottom) * (1 - middle_valley_scale)),
-        (x_left + width * (1 - m_width_scale) / 2 + width * m_width_scale * 0.7, y_bottom),
-        (x_left + width * (1 - m_width_scale) / 2 + width * m_width_scale, y_top - (y_top - y_bottom) * (1 - m_height_scale))
-    ]
-    xs, ys = zip(*m_points)
+    x0 = x_left + width * (1 - m_width_scale) / 2
+    xs = x0 + width * m_width_scale * np.array([0.0, 0.3, 0.5, 0.7, 1.0])
+    height = y_top - y_bottom
+    ys = np.stack([
+        y_top - height * (1 - m_height_scale),
+        y_bottom,
+        y_bottom + height * (1 - middle_valley_scale),
+        y_bottom,
+        y_top - height * (1 - m_height_scale),
+    ], axis=1)
+    return np.stack([np.broadcast_to(xs, ys.shape), ys], axis=2)
+
+def create_m_with_shorter_middle(ax, x_left, x_right, y_bottom, y_top):
+    xs, ys = m_glyph_vertices(x_left, x_right, y_bottom, y_top)[0].T
     ax.plot(xs, ys, color="brown", linewidth=0.7)
 
 def normalize_for_pretty_plot(parsed):
@@ -210,128 +331,266 @@ def get_termination_code(d):
         v = d.get("termination_type")
     return (str(v).strip().upper() if v is not None else "-")
 
-def plot_corrected_z_title(tek_data, maalajipylvas_width=0.15):
-    depth = tek_data["depth"]
-    if not depth:
-        print("No data rows for the selected point.")
-        return
+TERMINATION_SYMBOLS = {
+    "TM": kairauksen_paattyminen.kairaus_paattynyt_tiiviiseen_maakerrokseen,
+    "KI": kairauksen_paattyminen.kairaus_paattynyt_kiveen_tai_lohkareeseen,
+    "KL": kairauksen_paattyminen.kairaus_paattynyt_kiveen_lohkareeseen_tai_kallioon,
+    "KA": kairauksen_paattyminen.kairaus_paattynyt_kallioon_varmistettu_kallio,
+    "MS": kairauksen_paattyminen.kairaus_paattynyt_maarasyvyyteen,
+    "KN": kairauksen_paattyminen.kairaus_paattynyt_kiilautumalla_kivien_tai_lohkareiden_valiin,
+}
 
-    weight = [w / 100 for w in tek_data["weight"]]
-    half_turns = tek_data["half_turns"]
-    soil_types = [s.title() if isinstance(s, str) else s for s in tek_data["soil_type"]]
-
-    z_value = tek_data["Z"][0]
-    point1  = tek_data["point"][0]
-    org     = tek_data["Or"][0]
-    tyonro  = tek_data["Tyonro"][0]
-    termination_type = get_termination_code(tek_data)
-
-    date = tek_data.get("date", "-")
-    Y = tek_data.get("Y", 0.0)
-    X = tek_data.get("X", 0.0)
-
-    center = 0.0
-    left  = center - maalajipylvas_width / 2
-    right = center + maalajipylvas_width / 2
-
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    y_min, y_max = min(depth), max(depth)
-    top_pad, bot_pad = 1.0, 0.7
-    y_top = y_min - top_pad
-    y_bottom = y_max + bot_pad
-    ax.set_xlim(-1, 5)
-    ax.set_ylim(y_bottom, y_top)
-
-    ax.add_patch(
-        patches.Rectangle(
-            (left, y_min),
-            maalajipylvas_width,
-            y_max - y_min,
-            fill=False, edgecolor="black", linewidth=0.25
-        )
-    )
-
-    ax.plot([left, left],   [y_min, y_max], color="black", linewidth=0.5, zorder=2)
-    ax.plot([right, right], [y_min, y_max], color="black", linewidth=0.5, zorder=2)
-
-    for i in range(len(depth) - 1):
-        symbol = ""
-        color = "black"
-        if soil_types[i] == "Mr":
-            create_m_with_shorter_middle(ax, left, right, depth[i], depth[i + 1])
-        elif soil_types[i] == "Sa":
-            symbol, color = "|", "#64f6f4"
-        elif soil_types[i] == "Si":
-            symbol, color = "||", "purple"
-        elif soil_types[i] == "Sr":
-            symbol, color = "o o", "green"
-        elif soil_types[i] == "Hk":
-            symbol, color = ". .", "#F0EA52"
-        elif soil_types[i] == "Ki":
-            symbol, color = "▲", "black"
-        if symbol:
-            ax.text((left + right) / 2, (depth[i] + depth[i + 1]) / 2,
-                    symbol, fontsize=10, ha="center", color=color)
-
-    last_value = None
-    for i in range(len(depth) - 1):
-        ht = half_turns[i]
-        if ht is None or ht > 100:
-            continue
-        if ht == 0:
-            start_x = last_value if last_value is not None else left
-            x = left - weight[i]
-            ax.plot([start_x, x], [depth[i], depth[i]], color="black", linewidth=0.5, zorder=3)
-            ax.plot([x, x], [depth[i], depth[i + 1]], color="black", linewidth=0.5, zorder=3)
-            last_value = x
-        elif ht > 0:
-            start_x = last_value if last_value is not None else right
-            x = right + ht / 100.0
-            ax.plot([start_x, x], [depth[i], depth[i]], color="black", linewidth=0.5, zorder=3)
-            ax.plot([x, x], [depth[i], depth[i + 1]], color="black", linewidth=0.5, zorder=3)
-            last_value = x
-
-    for s in ("top", "right", "left", "bottom"):
-        ax.spines[s].set_visible(False)
-    ax.grid(False)
-    ax.set_ylabel("Syvyys (m)", fontsize=16)
-
-    xticks = [left, left - 1, 0, right, right + 0.2, right + 0.4, right + 0.6, right + 0.8, right + 1.0]
-    xtick_labels = ["0", "1 kN", "", "0", "20", "40", "60", "80", "100 pk/20cm"]
-    ax.set_xticks(xticks)
-    ax.set_xticklabels(xtick_labels, fontsize=8)
-
-    plt.text(-1.5, -0.2, "Paino", fontsize=16, ha="left", va="center")
-    plt.text( 0.5, -0.2, "Kierto", fontsize=16, ha="left", va="center")
-
-    plt.text(
-        -1.5, y_min - 0.6,
-        f"Työn nro: {tyonro} Piste: {point1}",
-        fontsize=16, ha="left", va="bottom"
-    )
-
-    draw_map = {
-        "TM": kairauksen_paattyminen.kairaus_paattynyt_tiiviiseen_maakerrokseen,
-        "KI": kairauksen_paattyminen.kairaus_paattynyt_kiveen_tai_lohkareeseen,
-        "KL": kairauksen_paattyminen.kairaus_paattynyt_kiveen_lohkareeseen_tai_kallioon,
-        "KA": kairauksen_paattyminen.kairaus_paattynyt_kallioon_varmistettu_kallio,
-        "MS": kairauksen_paattyminen.kairaus_paattynyt_maarasyvyyteen,
-        "KN": kairauksen_paattyminen.kairaus_paattynyt_kiilautumalla_kivien_tai_lohkareiden_valiin,
-    }
-    y_bottom_symbol = y_max - 0.6
-    fn = draw_map.get(termination_type)
-    if fn:
-        fn(ax, x_center=0, y_bottom=y_bottom_symbol)
-    else:
-        print(f"[WARN] Unknown termination code '{termination_type}', no symbol drawn.")
+def step_curve_segments(tops, bottoms, weight, half_turns, left, right):
+    """
+    Paino- ja kiertokäyrän janat yhdeksi LineCollectioniksi: (n, 3, 2)
+    murtoviivat vaakajana edellisestä arvosta + pystyjana välin läpi.
+    Välit, joiden puolikierroksia ei ole, on yli 100 tai ne ovat
+    negatiivisia, ohitetaan.
+    """
+    ht = np.array([np.nan if h is None else h for h in half_turns], dtype=float)
+    keep = (ht >= 0) & (ht <= 100)
+    tops, bottoms, ht = tops[keep], bottoms[keep], ht[keep]
+    if not len(ht):
+        return np.empty((0, 3, 2))
+    x = np.where(ht == 0, left - np.asarray(weight, dtype=float)[keep], right + ht / 100.0)
+    start_x = np.empty_like(x)
+    start_x[0] = left if ht[0] == 0 else right
+    start_x[1:] = x[:-1]
+    return np.stack([
+        np.stack([start_x, tops], axis=1),
+        np.stack([x, tops], axis=1),
+        np.stack([x, bottoms], axis=1),
+    ], axis=1)
+
+# Maalajien merkit: maalaji -> (väri, merkki, koko pt, reunaviivan leveys pt, täytetty,
+# [(dx, dy) pt tekstin perusviivasta]). Vastaavat aiempia fontsize=10-tekstimerkkejä
+# ("|", "||", "o o", ". .", "▲").
+SOIL_SYMBOLS = {
+    "Sa": ("#64f6f4", "|", 10.0, 0.9, True, [(0.0, 2.6)]),
+    "Si": ("purple", "|", 10.0, 0.9, True, [(-1.7, 2.6), (1.7, 2.6)]),
+    "Sr": ("green", "o", 4.4, 0.9, False, [(-4.6, 2.7), (4.6, 2.7)]),
+    "Hk": ("#F0EA52", "o", 1.3, 0.0, True, [(-3.2, 0.6), (3.2, 0.6)]),
+    "Ki": ("black", "^", 9.0, 0.0, True, [(0.0, 3.6)]),
+}
+
+class SoundingSheet:
+    """
+    Painokairauslokin piirtopohja. Kuva, akselit, akselien tekstit ja
+    maalajipylvään kehys luodaan kerran; draw() päivittää ne ja poistaa
+    edellisen lokin kairauskohtaiset piirrokset, joten sama pohja kelpaa
+    tuhansien lokien eräajoon.
+    """
+
+    def __init__(self, maalajipylvas_width=0.15, figsize=(10, 8)):
+        self.fig, self.ax = plt.subplots(figsize=figsize)
+        ax = self.ax
+        center = 0.0
+        self.left = left = center - maalajipylvas_width / 2
+        self.right = right = center + maalajipylvas_width / 2
+        self.width = maalajipylvas_width
+
+        ax.set_xlim(-1, 5)
+        for s in ("top", "right", "left", "bottom"):
+            ax.spines[s].set_visible(False)
+        ax.grid(False)
+        ax.set_ylabel("Syvyys (m)", fontsize=16)
+
+        xticks = [left, left - 1, 0, right, right + 0.2, right + 0.4, right + 0.6, right + 0.8, right + 1.0]
+        xtick_labels = ["0", "1 kN", "", "0", "20", "40", "60", "80", "100 pk/20cm"]
+        ax.set_xticks(xticks)
+        ax.set_xticklabels(xtick_labels, fontsize=8)
+
+        ax.text(-1.5, -0.2, "Paino", fontsize=16, ha="left", va="center")
+        ax.text( 0.5, -0.2, "Kierto", fontsize=16, ha="left", va="center")
+
+        self.column = patches.Rectangle((left, 0), maalajipylvas_width, 0,
+                                        fill=False, edgecolor="black", linewidth=0.25)
+        ax.add_patch(self.column)
+        self.left_edge, = ax.plot([left, left], [0, 0], color="black", linewidth=0.5, zorder=2)
+        self.right_edge, = ax.plot([right, right], [0, 0], color="black", linewidth=0.5, zorder=2)
+        self.title = ax.text(-1.5, 0, "", fontsize=16, ha="left", va="bottom")
+        self.z_label = ax.text(-0.35, -0.15, "", fontsize=16, ha="left", va="center")
+
+        # Lokikohtainen data kootaan muutamaan pysyvään kokoelmaan
+        self.m_glyphs = ax.add_collection(LineCollection([], colors="brown", linewidths=0.7, zorder=2),
+                                          autolim=False)
+        self.curve = ax.add_collection(LineCollection([], colors="black", linewidths=0.5, zorder=3),
+                                       autolim=False)
+        self.soil_markers = []
+        for soil, (color, marker, size, edge_width, filled, offsets) in SOIL_SYMBOLS.items():
+            for dx, dy in offsets:
+                line, = ax.plot([], [], linestyle="none", marker=marker, markersize=size, color=color,
+                                markerfacecolor=color if filled else "none", markeredgewidth=edge_width, zorder=3,
+                                transform=offset_copy(ax.transData, self.fig, x=dx, y=dy, units="points"))
+                self.soil_markers.append((soil, line))
+
+        self._base_artists = set(ax.get_children())
+        # tight_layout lähtee edellisen lokin asettelusta; palautetaan alkuperäinen ennen sitä
+        self._subplot_params = {k: getattr(self.fig.subplotpars, k)
+                                for k in ("left", "right", "bottom", "top", "wspace", "hspace")}
+
+    def _clear_log(self):
+        for artist in self.ax.get_children():
+            if artist not in self._base_artists:
+                artist.remove()
+        self.m_glyphs.set_segments([])
+        self.curve.set_segments([])
+        for _, line in self.soil_markers:
+            line.set_data([], [])
+
+    def draw(self, tek_data):
+        """Piirtää lokin pohjalle. Palauttaa False, jos pisteellä ei ole datarivejä."""
+        self._clear_log()
+        ax = self.ax
+        left, right = self.left, self.right
+
+        depth = tek_data["depth"]
+        if not depth:
+            print("No data rows for the selected point.")
+            return False
+
+        weight = [w / 100 for w in tek_data["weight"]]
+        half_turns = tek_data["half_turns"]
+        soil_types = [s.title() if isinstance(s, str) else s for s in tek_data["soil_type"]]
+
+        z_value = tek_data["Z"][0]
+        point1  = tek_data["point"][0]
+        tyonro  = tek_data["Tyonro"][0]
+        termination_type = get_termination_code(tek_data)
+
+        y_min, y_max = min(depth), max(depth)
+        top_pad, bot_pad = 1.0, 0.7
+        y_top = y_min - top_pad
+        y_bottom = y_max + bot_pad
+        ax.set_ylim(y_bottom, y_top)
+
+        self.column.set_y(y_min)
+        self.column.set_height(y_max - y_min)
+        self.left_edge.set_ydata([y_min, y_max])
+        self.right_edge.set_ydata([y_min, y_max])
+
+        depth_arr = np.asarray(depth, dtype=float)
+        tops, bottoms = depth_arr[:-1], depth_arr[1:]
+        soil = np.asarray(soil_types[:len(tops)], dtype=object)
+
+        mr = soil == "Mr"
+        self.m_glyphs.set_segments(m_glyph_vertices(left, right, tops[mr], bottoms[mr]))
+        middle = (tops + bottoms) / 2
+        for soil_name, line in self.soil_markers:
+            rows = soil == soil_name
+            line.set_data(np.full(rows.sum(), (left + right) / 2), middle[rows])
+
+        self.curve.set_segments(step_curve_segments(tops, bottoms, weight[:len(tops)],
+                                                    half_turns[:len(tops)], left, right))
+
+        self.title.set_y(y_min - 0.6)
+        self.title.set_text(f"Työn nro: {tyonro} Piste: {point1}")
+
+        y_bottom_symbol = y_max - 0.6
+        fn = TERMINATION_SYMBOLS.get(termination_type)
+        if fn:
+            fn(ax, x_center=0, y_bottom=y_bottom_symbol)
+        else:
+            print(f"[WARN] Unknown termination code '{termination_type}', no symbol drawn.")
 
-    ax.text(-0.35, -0.15, f"{'+' if z_value >= 0 else ''}{z_value:.3f}", fontsize=16, ha="left", va="center")
+        self.z_label.set_text(f"{'+' if z_value >= 0 else ''}{z_value:.3f}")
 
-    plt.tight_layout()
+        self.fig.subplots_adjust(**self._subplot_params)
+        self.fig.tight_layout()
+        return True
+
+def plot_corrected_z_title(tek_data, maalajipylvas_width=0.15):
+    sheet = SoundingSheet(maalajipylvas_width)
+    if not sheet.draw(tek_data):
+        plt.close(sheet.fig)
+        return
     plt.show()
 
+# Eräajon työprosessin piirtopohja; luodaan prosessin ensimmäiselle lokille
+_WORKER_SHEET = None
+
+def _init_render_worker():
+    plt.switch_backend("Agg")
+
+def _render_sounding(job):
+    global _WORKER_SHEET
+    tek_data, path, dpi = job
+    if _WORKER_SHEET is None:
+        _WORKER_SHEET = SoundingSheet()
+    try:
+        if not _WORKER_SHEET.draw(tek_data):
+            return path, "no data rows"
+        _WORKER_SHEET.fig.savefig(path, dpi=dpi)
+    except Exception as e:
+        return path, f"{type(e).__name__}: {e}"
+    return path, None
+
+def _safe_name(text):
+    return re.sub(r"[^\w.-]+", "_", str(text)).strip("_") or "-"
+
+def render_all_soundings(tek_files, out_dir, fmt="png", workers=None, dpi=100,
+                         sounding_types=SOUNDING_TYPES):
+    """
+    Piirtää kaikkien annettujen TEK-tiedostojen kairauspisteet tiedostoiksi
+    <out_dir>/<työnro>_<piste>.<fmt> (png tai pdf) Agg-taustalla
+    prosessipoolissa. Jokainen työprosessi käyttää samaa SoundingSheet-
+    pohjaa kaikille lokeilleen. Palauttaa kirjoitetut polut.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs, used = [], {}
+    for tek_file in tek_files:
+        for parsed in iter_tek_soundings(tek_file, sounding_types):
+            name = f"{_safe_name(parsed['Tyonro'])}_{_safe_name(parsed['point'])}"
+            used[name] = used.get(name, 0) + 1
+            if used[name] > 1:
+                name = f"{name}_{used[name]}"
+            jobs.append((normalize_for_pretty_plot(parsed), os.path.join(out_dir, f"{name}.{fmt}"), dpi))
+    if not jobs:
+        print("[INFO] Ei piirrettäviä kairauksia.")
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    chunksize = max(1, len(jobs) // (workers * 4))
+    start = datetime.now()
+    if workers == 1:
+        _init_render_worker()
+        results = list(map(_render_sounding, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_render_worker) as pool:
+            results = list(pool.map(_render_sounding, jobs, chunksize=chunksize))
+
+    written = [path for path, error in results if error is None]
+    for path, error in results:
+        if error is not None:
+            print(f"[WARN] {os.path.basename(path)}: {error}")
+    seconds = (datetime.now() - start).total_seconds()
+    print(f"[INFO] {len(written)}/{len(jobs)} lokia kirjoitettu kansioon {out_dir} "
+          f"({seconds:.1f} s, {workers} prosessia)")
+    return written
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Painokairauslokit: yksittäinen piirto tai eräajo.")
+    parser.add_argument("--batch", metavar="TEK", nargs="+",
+                        help="TEK-tiedostot tai kansiot, joiden kaikki kairaukset piirretään tiedostoiksi")
+    parser.add_argument("--out", default="painokairaus_lokit", help="eräajon tulostekansio")
+    parser.add_argument("--format", choices=["png", "pdf"], default="png", help="eräajon tiedostomuoto")
+    parser.add_argument("--workers", type=int, help="piirtoprosessien määrä (oletus: CPU-ytimet)")
+    parser.add_argument("--dpi", type=int, default=100, help="PNG-kuvien tarkkuus")
+    parser.add_argument("--all-types", action="store_true",
+                        help="piirrä kaikki tutkimustavat, ei vain painokairauksia (TT PA)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.batch:
+        tek_files = []
+        for source in args.batch:
+            tek_files.extend(list_input_files(source) if os.path.isdir(source) else [source])
+        render_all_soundings(tek_files, args.out, fmt=args.format, workers=args.workers, dpi=args.dpi,
+                             sounding_types=None if args.all_types else SOUNDING_TYPES)
+        sys.exit(0)
+
     input_dir = resolve_input_dir()
     print(f"Käytettävä kansio: {input_dir}")
     tek_file = choose_file_from_dir(input_dir)
@@ -0,0 +1,74 @@
+# src/data_processing/batch_ingest.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import glob
+import os
+import time
+
+import pandas as pd
+
+from data_processing.parse_tek import iter_boreholes, load_parser_config
+from data_processing.borehole_store import BoreholeStore
+
+TEK_SUFFIXES = ('.tek', '.txt')
+
+
+def resolve_input_files(source) -> list[str]:
+    """Hakemisto (kaikki .tek/.txt) tai glob-lauseke -> lajiteltu tiedostolista."""
+    p = Path(source)
+    if p.is_dir():
+        files = [f for f in p.iterdir() if f.is_file() and f.suffix.lower() in TEK_SUFFIXES]
+    else:
+        files = [Path(f) for f in glob.glob(str(source), recursive=True) if Path(f).is_file()]
+    return sorted(str(f.resolve()) for f in files)
+
+
+def _parse_file(path):
+    t0 = time.perf_counter()
+    store = BoreholeStore.from_records(iter_boreholes(path, load_parser_config()))
+    return path, store, time.perf_counter() - t0, os.path.getsize(path)
+
+
+def deduplicate(store):
+    """
+    Poistaa toistuvat kairaukset avaimella (TY, nro, X, Y, TT); ensimmäinen
+    esiintymä jää. TT on mukana, koska samassa pisteessä on usein eri
+    tutkimustapoja (PO, PA, SI), jotka eivät ole kaksoiskappaleita.
+    """
+    keys = pd.DataFrame({"ty": store.ty, "nro": store.nro, "x": store.x, "y": store.y,
+                         "tt": store.tt})
+    keep = (~keys.duplicated(keep="first")).to_numpy().nonzero()[0]
+    return store.take(keep), len(store) - len(keep)
+
+
+def ingest_batch(source, max_workers=None):
+    """
+    Jäsentää kaikki lähteen .tek-tiedostot rinnakkain prosessipoolissa,
+    yhdistää ne yhdeksi BoreholeStoreksi ja poistaa kaksoiskappaleet.
+    Tulostaa tiedostokohtaisen läpäisyn.
+    """
+    files = resolve_input_files(source)
+    if not files:
+        print(f"→ No input files found for batch source: {source}")
+        return None
+
+    workers = min(max_workers or os.cpu_count() or 1, len(files))
+    print(f"→ Batch ingest: {len(files)} files, {workers} worker processes")
+
+    t0 = time.perf_counter()
+    stores = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_parse_file, f) for f in files]
+        for fut in as_completed(futures):
+            path, store, seconds, size = fut.result()
+            stores[path] = store
+            rate = len(store) / seconds if seconds > 0 else float("inf")
+            print(f"  {Path(path).name}: {len(store)} boreholes, {size / 1e6:.2f} MB "
+                  f"in {seconds:.3f} s ({rate:,.0f} boreholes/s, {size / 1e6 / max(seconds, 1e-9):.1f} MB/s)")
+
+    # Tiedostojärjestys ratkaisee, mikä kaksoiskappale säilyy
+    merged, dropped = deduplicate(BoreholeStore.concat(stores[f] for f in files))
+    elapsed = time.perf_counter() - t0
+    print(f"→ Batch ingest done: {len(merged)} unique boreholes "
+          f"({dropped} duplicates dropped) in {elapsed:.2f} s")
+    return merged
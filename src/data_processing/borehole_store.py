@@ -0,0 +1,182 @@
+# src/data_processing/borehole_store.py
+from array import array
+from dataclasses import dataclass
+import math
+
+import numpy as np
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _encode(value, labels, lookup):
+    code = lookup.get(value)
+    if code is None:
+        code = lookup[value] = len(labels)
+        labels.append(value)
+    return code
+
+
+@dataclass
+class BoreholeStore:
+    """
+    Kairaukset sarakemuodossa. Kairauskohtaiset tiedot ovat yhtä pitkiä
+    taulukoita; kerrosrajat ovat litteinä taulukoina, ja kairauksen i
+    rivit ovat välillä layer_offsets[i]:layer_offsets[i + 1].
+    """
+    nro: np.ndarray            # object (str)
+    ty_code: np.ndarray        # int32 -> ty_labels
+    tt_code: np.ndarray        # int32 -> tt_labels
+    x: np.ndarray              # float64
+    y: np.ndarray              # float64
+    z: np.ndarray              # float32
+    end_depth: np.ndarray      # float32, NaN jos puuttuu
+    layer_offsets: np.ndarray  # int64, pituus len(self) + 1
+    layer_code: np.ndarray     # int32 -> layer_labels
+    layer_depth: np.ndarray    # float32, NaN jos ei numero
+    ty_labels: list
+    tt_labels: list
+    layer_labels: list
+
+    def __len__(self):
+        return len(self.nro)
+
+    @classmethod
+    def from_records(cls, records, layer_columns=None):
+        """
+        Rakentaa varaston iter_boreholes-generaattorin tietueista yhdellä
+        läpikäynnillä. layer_columns rajaa kerrossarakkeet; oletuksena
+        kaikki listamuotoiset kentät.
+        """
+        nro = []
+        ty_code, tt_code = array("i"), array("i")
+        x, y = array("d"), array("d")
+        z, end_depth = array("f"), array("f")
+        layer_offsets = array("q", [0])
+        layer_code, layer_depth = array("i"), array("f")
+        ty_labels, tt_labels, layer_labels = [], [], []
+        ty_lookup, tt_lookup, layer_lookup = {}, {}, {}
+
+        if layer_columns is not None:
+            for col in layer_columns:
+                _encode(col, layer_labels, layer_lookup)
+
+        for rec in records:
+            nro.append(rec.get("nro", ""))
+            ty_code.append(_encode(rec.get("TY", ""), ty_labels, ty_lookup))
+            tt_code.append(_encode(rec.get("TT", ""), tt_labels, tt_lookup))
+            x.append(_to_float(rec.get("X")))
+            y.append(_to_float(rec.get("Y")))
+            z.append(_to_float(rec.get("Z")))
+            end_depth.append(_to_float(rec.get("Paattymissyvyys")))
+
+            for col, depths in rec.items():
+                if not isinstance(depths, list) or not depths:
+                    continue
+                if layer_columns is not None and col not in layer_lookup:
+                    continue
+                code = _encode(col, layer_labels, layer_lookup)
+                for d in depths:
+                    if str(d).strip() == "":
+                        continue
+                    layer_code.append(code)
+                    layer_depth.append(_to_float(d))
+            layer_offsets.append(len(layer_code))
+
+        return cls(
+            nro=np.array(nro, dtype=object),
+            ty_code=np.frombuffer(ty_code, dtype=np.int32).copy(),
+            tt_code=np.frombuffer(tt_code, dtype=np.int32).copy(),
+            x=np.frombuffer(x, dtype=np.float64).copy(),
+            y=np.frombuffer(y, dtype=np.float64).copy(),
+            z=np.frombuffer(z, dtype=np.float32).copy(),
+            end_depth=np.frombuffer(end_depth, dtype=np.float32).copy(),
+            layer_offsets=np.frombuffer(layer_offsets, dtype=np.int64).copy(),
+            layer_code=np.frombuffer(layer_code, dtype=np.int32).copy(),
+            layer_depth=np.frombuffer(layer_depth, dtype=np.float32).copy(),
+            ty_labels=ty_labels,
+            tt_labels=tt_labels,
+            layer_labels=layer_labels,
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """Yhdistää useita varastoja; koodit uudelleenkoodataan yhteisiin nimilistoihin."""
+        stores = list(stores)
+        merged = {"ty_labels": [], "tt_labels": [], "layer_labels": []}
+        lookups = {key: {} for key in merged}
+        codes = {"ty_code": [], "tt_code": [], "layer_code": []}
+        for st in stores:
+            for code_key, label_key in (("ty_code", "ty_labels"), ("tt_code", "tt_labels"),
+                                        ("layer_code", "layer_labels")):
+                remap = np.array([_encode(v, merged[label_key], lookups[label_key])
+                                  for v in getattr(st, label_key)], dtype=np.int32)
+                src = getattr(st, code_key)
+                codes[code_key].append(remap[src] if src.size else src)
+
+        shifts = np.cumsum([0] + [len(st.layer_code) for st in stores[:-1]])
+        layer_offsets = [np.zeros(1, dtype=np.int64)]
+        layer_offsets += [st.layer_offsets[1:] + shift for st, shift in zip(stores, shifts)]
+
+        return cls(
+            nro=np.concatenate([np.empty(0, dtype=object)] + [st.nro for st in stores]),
+            ty_code=np.concatenate([np.empty(0, dtype=np.int32)] + codes["ty_code"]),
+            tt_code=np.concatenate([np.empty(0, dtype=np.int32)] + codes["tt_code"]),
+            x=np.concatenate([np.empty(0)] + [st.x for st in stores]),
+            y=np.concatenate([np.empty(0)] + [st.y for st in stores]),
+            z=np.concatenate([np.empty(0, dtype=np.float32)] + [st.z for st in stores]),
+            end_depth=np.concatenate([np.empty(0, dtype=np.float32)] + [st.end_depth for st in stores]),
+            layer_offsets=np.concatenate(layer_offsets),
+            layer_code=np.concatenate([np.empty(0, dtype=np.int32)] + codes["layer_code"]),
+            layer_depth=np.concatenate([np.empty(0, dtype=np.float32)] + [st.layer_depth for st in stores]),
+            **merged,
+        )
+
+    def take(self, indices):
+        """Uusi varasto, jossa vain annetut kairaukset (annetussa järjestyksessä)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = np.diff(self.layer_offsets)[indices]
+        starts = self.layer_offsets[:-1][indices]
+        new_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        rows = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+        return BoreholeStore(
+            nro=self.nro[indices],
+            ty_code=self.ty_code[indices],
+            tt_code=self.tt_code[indices],
+            x=self.x[indices],
+            y=self.y[indices],
+            z=self.z[indices],
+            end_depth=self.end_depth[indices],
+            layer_offsets=new_offsets,
+            layer_code=self.layer_code[rows],
+            layer_depth=self.layer_depth[rows],
+            ty_labels=list(self.ty_labels),
+            tt_labels=list(self.tt_labels),
+            layer_labels=list(self.layer_labels),
+        )
+
+    @property
+    def ty(self):
+        return np.array(self.ty_labels, dtype=object)[self.ty_code]
+
+    @property
+    def tt(self):
+        return np.array(self.tt_labels, dtype=object)[self.tt_code]
+
+    def layer_borehole(self):
+        """Kerrosrivin kairausindeksi (int64) jokaiselle layer_*-riville."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.layer_offsets))
+
+    def layers(self, i):
+        """Kairauksen i kerrosrivit: (koodit, syvyydet)."""
+        start, stop = self.layer_offsets[i], self.layer_offsets[i + 1]
+        return self.layer_code[start:stop], self.layer_depth[start:stop]
+
+    def nbytes(self):
+        arrays = (self.ty_code, self.tt_code, self.x, self.y, self.z, self.end_depth,
+                  self.layer_offsets, self.layer_code, self.layer_depth)
+        return sum(a.nbytes for a in arrays) + sum(len(str(n)) for n in self.nro)
@@ -0,0 +1,109 @@
+# src/data_processing/build_offsets.py
+import numpy as np
+import pandas as pd
+
+FORMATION_COLS = ['Sa', 'Mr', 'Ka', 'Sr', 'SR', 'Sasi', 'Srmr', 'liSa', 'Ki']
+SKIP_TT_VALUES = {"PO - 0", "NO 1 - - -", "SI  0 0"}
+
+
+def layer_filters(config):
+    layers_to_include = set(config.get("layers_to_include", []))
+    layers_to_ignore = set(config.get("layers_to_ignore", []))
+
+    if layers_to_include and 'kallio' in layers_to_include and 'Mr' not in layers_to_include:
+        layers_to_include.add('Mr')
+    return layers_to_include, layers_to_ignore
+
+
+def borehole_offsets(store, config, with_index=False):
+    """
+    Laskee kerrosten alapintojen korot kaikille kairauksille kerralla.
+
+    Palauttaa (DataFrame[piste, X, Y, Z, formation], kairauksia yhteensä,
+    käytettyjä kairauksia). Rivit ovat samassa järjestyksessä kuin
+    kairaus kerrallaan laskettaessa: kairaukset tiedoston järjestyksessä,
+    kerrokset yläpinnan syvyyden mukaan. with_index=True lisää sarakkeen
+    'borehole' (kairauksen indeksi varastossa).
+    """
+    layers_to_include, layers_to_ignore = layer_filters(config)
+    alias_map = {k.lower(): v for k, v in config.get("alias_map", {}).items()}
+
+    x = store.x
+    y = store.y
+    z = store.z.astype(np.float64)
+    end_depth = store.end_depth.astype(np.float64)
+
+    skip_codes = [i for i, tt in enumerate(store.tt_labels) if tt in SKIP_TT_VALUES]
+    skip_tt = np.isin(store.tt_code, skip_codes)
+    invalid = ~skip_tt & (np.isnan(z) | np.isnan(end_depth) | np.isnan(x) | np.isnan(y))
+    for nro in store.nro[invalid]:
+        print(f"→ Skipping borehole {nro} due to parse error: missing X/Y/Z or end depth")
+    usable = ~(skip_tt | invalid)
+
+    # Varaston sarakekoodi -> sijainti FORMATION_COLS:ssa (-1 = ei käytetä)
+    col_rank = np.full(len(store.layer_labels), -1, dtype=np.int64)
+    for rank, col in enumerate(FORMATION_COLS):
+        if col in store.layer_labels:
+            col_rank[store.layer_labels.index(col)] = rank
+
+    layers = pd.DataFrame({
+        'b': store.layer_borehole(),
+        'col': col_rank[store.layer_code],
+        'depth': store.layer_depth.astype(np.float64),
+    })
+    layers = layers[(layers['col'] >= 0) & usable[layers['b'].to_numpy()]]
+    layers = layers.assign(bad=layers['depth'].isna())
+
+    groups = (layers.groupby(['b', 'col'], sort=False)
+              .agg(top=('depth', 'min'), bad=('bad', 'any'))
+              .reset_index())
+    groups = groups[~groups['bad']]
+
+    # Alias-nimet ovat käytössä 'Sa'-sarakkeesta eteenpäin, jos kairauksella on Sa-kerros
+    sa_ranks = [r for r, col in enumerate(FORMATION_COLS) if col.capitalize() == 'Sa']
+    first_sa = (groups[groups['col'].isin(sa_ranks)]
+                .groupby('b')['col'].min()
+                .reindex(groups['b'], fill_value=len(FORMATION_COLS))
+                .to_numpy())
+    col = groups['col'].to_numpy()
+    plain_names = np.array([c.capitalize() for c in FORMATION_COLS], dtype=object)
+    alias_names = np.array([alias_map.get(c.lower(), c).capitalize() for c in FORMATION_COLS], dtype=object)
+    groups = groups.assign(formation=np.where(col >= first_sa, alias_names[col], plain_names[col]))
+
+    if layers_to_include:
+        groups = groups[groups['formation'].isin(layers_to_include)]
+    else:
+        groups = groups[~groups['formation'].isin(layers_to_ignore)]
+
+    groups = groups.sort_values(['b', 'top', 'col'], kind='stable')
+    by_borehole = groups.groupby('b', sort=False)
+    rank = by_borehole.cumcount().to_numpy()
+    n_layers = by_borehole['top'].transform('size').to_numpy()
+    next_top = by_borehole['top'].shift(-1).to_numpy()
+
+    b = groups['b'].to_numpy()
+    bottom_depth = np.where(rank < n_layers - 1, next_top, end_depth[b])
+    bottom_z = np.round(z[b] - bottom_depth, 3)
+    bottom_z[rank == n_layers - 2] += 0.1
+
+    df = pd.DataFrame({
+        'piste': store.nro[b],
+        'X': x[b],
+        'Y': y[b],
+        'Z': bottom_z,
+        'formation': groups['formation'].to_numpy(),
+    })
+    if with_index:
+        df['borehole'] = b
+    return df, len(store), int(np.unique(b).size)
+
+
+def external_offsets(df_ext, formation, piste_base=20000):
+    """Ulkoiset pintapisteet offset-muotoon; piste = piste_base + rivin indeksi."""
+    return pd.DataFrame({
+        'piste': piste_base + df_ext.index.to_numpy(),
+        'X': df_ext['X'].to_numpy(dtype=np.float64),
+        'Y': df_ext['Y'].to_numpy(dtype=np.float64),
+        'Z': df_ext['Z'].to_numpy(dtype=np.float64),
+        'formation': formation,
+    })
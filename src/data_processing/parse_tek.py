@@ -0,0 +1,129 @@
+# src/data_processing/parse_tek.py
+from pathlib import Path
+import json
+import re
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CFG = ROOT / "aineiston_kasittely" / "config_files" / "config.json"
+DEFAULT_INPUT_DIR = ROOT / "aineiston_kasittely" / "input_data"
+
+NUMERIC_PATTERN = re.compile(r"\b\d+\.\d{2}\b")
+
+
+def load_parser_config(config_path: Path | str = DEFAULT_CFG) -> dict:
+    """Lukee config.json:n kerran ja palauttaa jäsentimen tarvitsemat osat."""
+    with Path(config_path).open("r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    line_keys = cfg["line_keys"]
+    return {
+        "entry": cfg["entry"],
+        "start_keys": tuple(cfg["start_keys"]),
+        "line_keys": line_keys,
+        # Sama kuin any(col in line for col in line_keys), mutta yhdellä haulla
+        "line_key_pattern": re.compile("|".join(re.escape(k) for k in line_keys)),
+        "alias_map": {k.lower(): v for k, v in cfg.get("alias_map", {}).items()},
+    }
+
+
+def new_entry(template: dict) -> dict:
+    # Listat kopioidaan, jotta pohja ei muutu kairausten välillä
+    return {k: (list(v) if isinstance(v, list) else v) for k, v in template.items()}
+
+
+def iter_boreholes(input_file, parser_config: dict | None = None):
+    """
+    Jäsentää .tek-tiedoston generaattorina: palauttaa yhden kairauksen
+    (dict, kuten config.json:n "entry") jokaista '-1'-loppuriviä kohden.
+    """
+    if parser_config is None:
+        parser_config = load_parser_config()
+    template = parser_config["entry"]
+    start_keys = parser_config["start_keys"]
+    line_key_pattern = parser_config["line_key_pattern"]
+    alias_map = parser_config["alias_map"]
+
+    entry = new_entry(template)
+    last_line = ""
+    alias_allowed = False
+
+    with open(input_file, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("PK"):
+                continue
+
+            if " " in line:
+                if line.startswith(start_keys):
+                    key, value = line.split(maxsplit=1)
+                    entry[key] = value
+
+                elif line.startswith("XY"):
+                    parts = line.split()
+                    entry["Y"], entry["X"], entry["Z"], entry["pvm"], entry["nro"] = parts[1:]
+
+                elif line.startswith("-1"):
+                    if entry["Paattymissyvyys"] == "":
+                        numeric_value = NUMERIC_PATTERN.findall(last_line)
+                        if numeric_value:
+                            entry["Paattymissyvyys"] = numeric_value[0]
+                    yield entry
+                    entry = new_entry(template)
+                    alias_allowed = False
+
+                elif line_key_pattern.search(line):
+                    parts = line.split()
+                    if len(parts) >= 2:
+                        raw_name = parts[-1].strip()
+                        raw_name_cap = raw_name.capitalize()
+
+                        if raw_name_cap == "Sa":
+                            alias_allowed = True
+
+                        name_effective = raw_name_cap
+                        if alias_allowed:
+                            name_effective = alias_map.get(raw_name.lower(), raw_name_cap)
+
+                        column_name = name_effective.capitalize()
+                        if column_name in entry:
+                            if isinstance(entry[column_name], list):
+                                entry[column_name].append(parts[0])
+                            else:
+                                entry[column_name] = [entry[column_name], parts[0]]
+                        elif column_name == "Paattymissyvyys":
+                            numeric_value = NUMERIC_PATTERN.findall(line)
+                            if numeric_value:
+                                entry[column_name] = numeric_value[0]
+
+            last_line = line
+
+
+def benchmark(input_files=None, repeat: int = 5) -> dict:
+    """
+    Mittaa jäsentimen nopeuden (kairausta/s). Oletuksena käytetään
+    input_data-kansion .tek-tiedostoja.
+    """
+    if not input_files:
+        input_files = sorted(DEFAULT_INPUT_DIR.glob("*.tek"))
+    parser_config = load_parser_config()
+
+    results = {}
+    for path in input_files:
+        path = Path(path)
+        best = float("inf")
+        count = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            count = sum(1 for _ in iter_boreholes(path, parser_config))
+            best = min(best, time.perf_counter() - t0)
+        rate = count / best if best > 0 else float("inf")
+        results[path.name] = {"records": count, "seconds": best, "records_per_s": rate}
+        print(f"→ {path.name}: {count} kairausta, {best * 1000:.2f} ms, {rate:,.0f} kairausta/s")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1:])
@@ -0,0 +1,136 @@
+# src/data_processing/thin_points.py
+import numpy as np
+import pandas as pd
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import cKDTree
+
+THINNING_METHODS = ("grid", "poisson", "error")
+
+
+def grid_thin(df, cell_size):
+    """Yksi piste ruutua kohden (lähinnä ruudun keskipistettä)."""
+    if df.empty:
+        return df
+    xy = df[['X', 'Y']].to_numpy(dtype=np.float64)
+    cell = np.floor(xy / cell_size).astype(np.int64)
+    dist = np.hypot(*((cell + 0.5) * cell_size - xy).T)
+    order = np.lexsort((dist, cell[:, 1], cell[:, 0]))
+    cell_sorted = cell[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(cell_sorted[1:] != cell_sorted[:-1], axis=1)
+    return df.iloc[np.sort(order[first])]
+
+
+def poisson_thin(df, radius, seed=0):
+    """
+    Poisson-disk-harvennus: pisteet käydään läpi satunnaisessa
+    järjestyksessä, ja jokainen hyväksytty piste poistaa naapurinsa
+    radius-säteeltä. Jäljelle jäävien pisteiden väli on vähintään radius.
+    """
+    if df.empty:
+        return df
+    xy = df[['X', 'Y']].to_numpy(dtype=np.float64)
+    tree = cKDTree(xy)
+    removed = np.zeros(len(xy), dtype=bool)
+    keep = []
+    for i in np.random.default_rng(seed).permutation(len(xy)):
+        if removed[i]:
+            continue
+        keep.append(i)
+        removed[tree.query_ball_point(xy[i], radius)] = True
+    return df.iloc[np.sort(keep)]
+
+
+def error_thin(df, tolerance, cell_size, max_rounds=20):
+    """
+    Virherajattu harvennus: aloitetaan karkeasta ruutuotoksesta ja lisätään
+    kierroksittain pahiten poikkeava piste jokaisesta ruudusta, kunnes
+    kaikkien pisteiden Z poikkeaa valittujen pisteiden lineaarisesta
+    interpolaatiosta enintään tolerance metriä. Jos raja ei täyty
+    max_rounds kierroksessa, tulostetaan suurin jäljelle jäänyt poikkeama.
+    Jos lähtöotoksesta ei voi interpoloida (alle 3 pistettä tai pisteet
+    samalla suoralla), kaikki pisteet säilytetään.
+    """
+    if len(df) < 4:
+        return df
+    label = f" {df['formation'].iloc[0]}" if 'formation' in df else ""
+    xyz = df[['X', 'Y', 'Z']].to_numpy(dtype=np.float64)
+    cell = np.floor(xyz[:, :2] / cell_size).astype(np.int64)
+    keep = np.zeros(len(df), dtype=bool)
+    keep[df.index.get_indexer(grid_thin(df, cell_size * 4).index)] = True
+    if keep.sum() < 3:
+        print(f"→ Error thinning{label}: tolerance {tolerance} m not reached from {keep.sum()} seed point(s); "
+              f"keeping all {len(df)} points")
+        return df
+
+    for round_no in range(max_rounds + 1):
+        try:
+            interp = LinearNDInterpolator(xyz[keep, :2], xyz[keep, 2])
+        except Exception:
+            print(f"→ Error thinning{label}: tolerance {tolerance} m not reached (degenerate "
+                  f"triangulation of {keep.sum()} points); keeping all {len(df)} points")
+            keep[:] = True
+            break
+        err = np.abs(interp(xyz[:, :2]) - xyz[:, 2])
+        err = np.where(np.isnan(err), np.inf, err)  # konveksin verhon ulkopuolella
+        err[keep] = 0.0
+        bad = np.flatnonzero(err > tolerance)
+        if bad.size == 0:
+            break
+        if round_no == max_rounds:
+            worst = err[bad].max()
+            print(f"→ Error thinning{label}: tolerance {tolerance} m not reached in {max_rounds} rounds; "
+                  f"{bad.size} points still off (max error {worst:.3f} m)")
+            break
+        # Pahin poikkeama ruutua kohden
+        order = bad[np.lexsort((-err[bad], cell[bad, 1], cell[bad, 0]))]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = np.any(cell[order[1:]] != cell[order[:-1]], axis=1)
+        keep[order[first]] = True
+    return df.iloc[np.flatnonzero(keep)]
+
+
+def thin_points(df, thinning):
+    """
+    Harventaa pintapisteet muodostumittain config.json-asetusten mukaan
+    ("thinning": {"method": "grid" | "poisson" | "error", "cell_size",
+    "radius", "tolerance"}). Palauttaa harvennetun DataFrame:n; rivien
+    järjestys säilyy.
+    """
+    method = (thinning or {}).get("method")
+    if not method or df.empty:
+        return df
+    if method not in THINNING_METHODS:
+        raise ValueError(f"Unknown thinning method '{method}'; choose from {THINNING_METHODS}")
+
+    cell_size = float(thinning.get("cell_size", 10.0))
+    parts = []
+    for _, group in df.groupby('formation', sort=False):
+        if method == "grid":
+            parts.append(grid_thin(group, cell_size))
+        elif method == "poisson":
+            parts.append(poisson_thin(group, float(thinning.get("radius", cell_size))))
+        else:
+            parts.append(error_thin(group, float(thinning.get("tolerance", 0.5)), cell_size))
+    return df[df.index.isin(pd.concat(parts).index)]
+
+
+def thinning_report(before, after, label="", untouched=0):
+    """
+    Tulostaa pistemäärät muodostumittain ja arvion ratkaisuajan säästöstä
+    (O(n³)). untouched on harventamattomien, malliin sellaisenaan menevien
+    pisteiden määrä (esim. kairauspisteet, kun harvennetaan vain ulkoiset);
+    säästö lasketaan koko yhtälöryhmän koosta.
+    """
+    counts = pd.DataFrame({
+        'before': before['formation'].value_counts(),
+        'after': after['formation'].value_counts(),
+    }).fillna(0).astype(int)
+    for formation, row in counts.iterrows():
+        print(f"→ Thinning {label}{formation}: {row['before']} → {row['after']} points")
+    print(f"→ Thinning {label}total: {len(before)} → {len(after)} points")
+    n0, n1 = len(before) + untouched, len(after) + untouched
+    if n0:
+        saving = 1 - (n1 / n0) ** 3
+        print(f"→ Kriging system size {n0} → {n1} points, O(n³) solve-time saving ~{saving:.0%}")
+    return counts
@@ -1,70 +1,38 @@
 import os
+import argparse
+import multiprocessing
+import pickle
+import tempfile
+import time
 
 from matplotlib.axes import Axes
 
 import json
 import numpy as np
+import pandas as pd
 import gempy as gp
 import gempy_viewer as gpv
 import matplotlib.pyplot as plt
 import pyvista as pv
-import trimesh
-import ezdxf
-import rasterio
-from rasterio.crs import CRS
-from rasterio.transform import from_origin
-from scipy.interpolate import griddata
 from main import main
 from topography import set_topography
+from model_resolution import grid_settings, compute_with_report
+from solver_engine import engine_settings
+from project_state import ProjectState, file_stamp
+from tiled_model import run_tiled, DEFAULT_TILE_SIZE, DEFAULT_TILE_OVERLAP
+from surface_export import export_surfaces, export_unit_bottoms, DEFAULT_SURFACE_FORMATS
+from utils.dem_tiles import DemSource, DEFAULT_DEM_PATH
+from utils.raster_cache import RasterCache, DEFAULT_CACHE_DIR, DEFAULT_BUDGET_MB
 from gempy.core.data import StackRelationType
 
 with open("aineiston_kasittely/config_files/config.json", "r", encoding="utf-8") as f:
     config = json.load(f)
 
-def convert_obj_to_dxf(obj_path, dxf_path):
-    mesh = trimesh.load(obj_path)
-    doc = ezdxf.new()
-    msp = doc.modelspace()
-    for face in mesh.faces:
-        pts = [mesh.vertices[i] for i in face]
-        if len(pts) == 3:
-            msp.add_3dface([pts[0], pts[1], pts[2]])
-    doc.saveas(dxf_path)
-    print(f"Saved DXF: {dxf_path}")
-
-def convert_obj_to_tif(obj_path, tif_path, pixel_size=2.0, nodata_val=-9999, crs_epsg=3067):
-    mesh = pv.read(obj_path)
-    points = mesh.points
-    x, y, z = points[:, 0], points[:, 1], points[:, 2]
-    x_min, x_max = x.min(), x.max()
-    y_min, y_max = y.min(), y.max()
-    grid_x, grid_y = np.meshgrid(
-        np.arange(x_min, x_max, pixel_size),
-        np.arange(y_max, y_min, -pixel_size)
-    )
-    grid_z = griddata((x, y), z, (grid_x, grid_y), method="linear")
-    grid_z_clean = np.where(np.isnan(grid_z), nodata_val, grid_z)
-    transform = from_origin(x_min, y_max, pixel_size, pixel_size)
-    
-    with rasterio.open(
-        tif_path, "w",
-        driver="GTiff",
-        height=grid_z.shape[0],
-        width=grid_z.shape[1],
-        count=1,
-        dtype="float32",
-        crs=CRS.from_epsg(crs_epsg),
-        transform=transform,
-        nodata=nodata_val
-    ) as dst:
-        dst.write(grid_z_clean.astype("float32"), 1)
-
-    print(f"Saved TIF: {tif_path}")
-
-def export_dc_meshes_as_surfaces(geo_model, output_folder="exported_meshes"):
-    os.makedirs(output_folder, exist_ok=True)
+def dc_mesh_surfaces(geo_model):
+    """Mallin dual contouring -pinnat (ilman kallioperää) PolyData-muodossa {nimi: pinta}."""
     names = [e.name for e in geo_model.structural_frame.structural_elements]
 
+    surfaces = {}
     for i, dc_mesh in enumerate(geo_model.solutions.dc_meshes):
         if dc_mesh is None:
             continue
@@ -77,41 +45,119 @@ def export_dc_meshes_as_surfaces(geo_model, output_folder="exported_meshes"):
             vertices_real = geo_model.input_transform.apply_inverse(dc_mesh.vertices)
             cloud = pv.PolyData(vertices_real)
             surface = cloud.delaunay_2d()
-
-            if surface.n_points > 0:
-                obj_path = os.path.join(output_folder, f"{name_i}_surface.obj")
-                vtp_path = os.path.join(output_folder, f"{name_i}_surface.vtp")
-                dxf_path = os.path.join(output_folder, f"{name_i}_surface.dxf")
-                tif_path = os.path.join(output_folder, f"{name_i}_surface.tif")
-
-                surface.save(obj_path)
-                surface.save(vtp_path)
-                print(f"Surface '{name_i}' saved as:")
-                print(f"  OBJ: {obj_path}")
-                print(f"  VTP: {vtp_path}")
-
-                convert_obj_to_dxf(obj_path, dxf_path)
-                convert_obj_to_tif(obj_path, tif_path)
-            else:
-                print(f"Surface '{name_i}' has no points — skipping.")
         except Exception as e:
             print(f"Error processing surface '{name_i}': {e}")
+            continue
 
-def gempy_main():
-    bounds = main()
-    if not bounds:
-        print("No bounds returned from main.main(). Aborting GemPy build.")
-        return
+        if surface.n_points > 0:
+            surfaces[name_i] = surface
+        else:
+            print(f"Surface '{name_i}' has no points — skipping.")
+    return surfaces
+
+def export_dc_meshes_as_surfaces(geo_model, output_folder="exported_meshes",
+                                 formats=DEFAULT_SURFACE_FORMATS, max_workers=None):
+    surfaces = dc_mesh_surfaces(geo_model)
+    return export_surfaces(surfaces, output_folder, formats=formats, max_workers=max_workers)
+
+# Mallista piirrettävät näkymät: (nimi, kwargs)
+PLOT_2D_VIEWS = [
+    ("2d_lith_ve2", dict(ve=2, show_data=True, show_scalar=False, show_lith=True, show_topography=True, topography_color="lightgray")),
+    ("2d_ve1", dict(ve=1, show_topography=True, show_data=True, legend=False)),
+    ("2d_ve3", dict(ve=3, show_topography=True, show_data=True, legend=False)),
+    ("2d_ve3_legend", dict(ve=3, show_topography=True, show_data=True, legend=True, scalar_field=False)),
+    ("2d_ve3_no_boundaries", dict(ve=3, show_topography=True, show_data=False, legend=True, show_boundaries=False)),
+    ("2d_ve3_x", dict(ve=3, direction='x', show_topography=True, show_data=True, legend=True, show_boundaries=False)),
+]
+PLOT_3D_VIEWS = [
+    ("3d_topo_lith", dict(ve=1, show_topography=True, show_lith=True)),
+    ("3d_topo", dict(ve=1, show_topography=True, show_lith=False)),
+    ("3d_topo_lith_2", dict(ve=1, show_topography=True, show_lith=True)),
+    ("3d_lith", dict(ve=1, show_topography=False, show_lith=True)),
+    ("3d_surfaces", dict(ve=1, show_topography=False, show_lith=False)),
+    ("3d_lith_no_data", dict(ve=1, show_data=False, show_topography=False, show_lith=True)),
+    ("3d_surfaces_no_data", dict(ve=1, show_data=False, show_topography=False, show_lith=False)),
+    ("3d_surfaces_ve2", dict(ve=2, show_topography=False, show_lith=False)),
+    ("3d_surfaces_ve3", dict(ve=3, show_topography=False, show_lith=False)),
+]
+
+def show_model_plots(geo_model):
+    for _, kwargs in PLOT_2D_VIEWS:
+        gpv.plot_2d(model=geo_model, **kwargs)
+    for _, kwargs in PLOT_3D_VIEWS:
+        gpv.plot_3d(geo_model, image=False, **kwargs)
+    plt.show()
+
+# Piirtoprosessien malli: ladataan kerran prosessia kohden (_init_render_worker)
+_RENDER_MODEL = None
+
+def _init_render_worker(model_path):
+    global _RENDER_MODEL
+    plt.switch_backend("Agg")
+    pv.OFF_SCREEN = True
+    with open(model_path, "rb") as f:
+        _RENDER_MODEL = pickle.load(f)
+
+def _render_view(job):
+    kind, name, kwargs, path = job
+    if kind == "2d":
+        p = gpv.plot_2d(model=_RENDER_MODEL, show=False, **kwargs)
+        p.fig.savefig(path, dpi=150, bbox_inches="tight")
+        plt.close(p.fig)
+    else:
+        gv = gpv.plot_3d(_RENDER_MODEL, show=False, image=False,
+                         kwargs_plotter={"off_screen": True}, **kwargs)
+        gv.p.screenshot(path)
+        gv.p.close()
+    return path
+
+def render_plots(geo_model, out_dir, workers=None):
+    """
+    Piirtää näkymät PNG-kuviksi ilman ikkunoita. Näkymät jaetaan
+    spawn-prosesseille, jotka lataavat jo lasketun mallin väliaikaisesta
+    pickle-tiedostosta (toimii myös Windowsissa).
+    """
+    global _RENDER_MODEL
+    os.makedirs(out_dir, exist_ok=True)
+    plt.switch_backend("Agg")
+    pv.OFF_SCREEN = True
+    jobs = [("2d", name, kwargs, os.path.join(out_dir, f"{name}.png")) for name, kwargs in PLOT_2D_VIEWS]
+    jobs += [("3d", name, kwargs, os.path.join(out_dir, f"{name}.png")) for name, kwargs in PLOT_3D_VIEWS]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        _RENDER_MODEL = geo_model
+        try:
+            paths = [_render_view(job) for job in jobs]
+        finally:
+            _RENDER_MODEL = None
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "geo_model.pkl")
+            with open(model_path, "wb") as f:
+                pickle.dump(geo_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_render_worker,
+                                                           initargs=(model_path,)) as pool:
+                paths = pool.map(_render_view, jobs, chunksize=1)
+    print(f"→ Rendered {len(paths)} views to {out_dir} in {time.perf_counter() - t0:.1f} s ({workers} workers)")
+    return paths
+
+SURFACE_POINTS_CSV = "aineiston_kasittely/output_data/offset_data.csv"
+ORIENTATIONS_CSV = "aineiston_kasittely/output_data/orientation_offset.csv"
+
+def build_geo_model(bounds, grid_kwargs, surface_points_csv=SURFACE_POINTS_CSV,
+                    orientations_csv=ORIENTATIONS_CSV):
     x_min, x_max, y_min, y_max, z_min, z_max = bounds
 
     geo_model = gp.create_geomodel(
         project_name="Luk-tutkielma",
         extent=[x_min, x_max, y_min, y_max, z_min, z_max],
-        resolution=[30, 30, 30],
         importer_helper=gp.data.ImporterHelper(
-            path_to_orientations="aineiston_kasittely/output_data/orientation_offset.csv",
-            path_to_surface_points="aineiston_kasittely/output_data/offset_data.csv",
+            path_to_orientations=orientations_csv,
+            path_to_surface_points=surface_points_csv,
         ),
+        **grid_kwargs,
     )
 
     gp.map_stack_to_surfaces(
@@ -200,34 +246,151 @@ def gempy_main():
 
     gp.set_section_grid(grid=geo_model.grid, section_dict=sections)
 
-    set_topography(geo_model, x_min, x_max, y_min, y_max, z_min, downsample_factor=1)
+    topo_cache = None
+    if config.get("topography_cache_dir", DEFAULT_CACHE_DIR):
+        topo_cache = RasterCache(config.get("topography_cache_dir", DEFAULT_CACHE_DIR),
+                                 budget_mb=config.get("topography_cache_mb", DEFAULT_BUDGET_MB))
+    set_topography(geo_model, x_min, x_max, y_min, y_max, z_min,
+                   downsample_factor=config.get("topography_downsample_factor", "auto"),
+                   resampling=config.get("topography_resampling", "average"),
+                   dem_source=config.get("dem_source", DEFAULT_DEM_PATH), cache=topo_cache)
+    return geo_model
+
+def resolution_sweep(bounds, voxel_sizes, engine=None, profile=False):
+    """Laskee mallin eri vokselikoilla ja tulostaa ajan ja muistin vertailua varten."""
+    engine_config, threads, _ = engine or (None, None, "")
+    pv.global_theme.allow_empty_mesh = True
+    results = []
+    for voxel in voxel_sizes:
+        grid_kwargs, label = grid_settings({}, bounds, voxel_size=voxel)
+        geo_model = build_geo_model(bounds, grid_kwargs)
+        results.append(compute_with_report(geo_model, label, engine_config, threads, profile=profile,
+                                           trace_memory=True))
+
+    print("\n--- Resolution sweep ---")
+    for r in results:
+        print(f"{r['label']}: {r['cells']:,} cells, {r['seconds']} s, {r['peak_mb']} MB")
+    print("------------------------\n")
+    return results
+
+def gempy_main(show_plots=True, render_to=None, render_workers=None, resolution=None,
+               voxel_size=None, octree_levels=None, sweep_voxel_sizes=None, force_recompute=False,
+               tile_size=None, engine_backend=None, engine_dtype=None, engine_threads=None,
+               profile_solve=False):
+    bounds = main()
+    if not bounds:
+        print("No bounds returned from main.main(). Aborting GemPy build.")
+        return
 
+    engine_config, threads, engine_label = engine_settings(config, engine_backend, engine_dtype, engine_threads)
+    print(f"→ Solver engine: {engine_label}")
+    profile_solve = profile_solve or config.get("engine", {}).get("profile", False)
+
+    if sweep_voxel_sizes:
+        return resolution_sweep(bounds, sweep_voxel_sizes, (engine_config, threads, engine_label),
+                                profile=profile_solve)
+
+    tiling = config.get("tiling", {})
+    if tile_size or tiling.get("enabled", False):
+        return run_tiled(bounds, config.get("export_meshes_folder", "exported_meshes"),
+                         tile_size=tile_size or tiling.get("tile_size", DEFAULT_TILE_SIZE),
+                         overlap=tiling.get("overlap", DEFAULT_TILE_OVERLAP),
+                         workers=tiling.get("workers"),
+                         pixel_size=tiling.get("pixel_size", 2.0),
+                         grid_args={"resolution": resolution, "voxel_size": voxel_size,
+                                    "octree_levels": octree_levels},
+                         engine_config=engine_config, threads=threads, profile=profile_solve,
+                         config=config,
+                         formats=config.get("surface_export_formats", DEFAULT_SURFACE_FORMATS))
+
+    grid_kwargs, grid_label = grid_settings(config, bounds, pd.read_csv(SURFACE_POINTS_CSV),
+                                            resolution=resolution, voxel_size=voxel_size,
+                                            octree_levels=octree_levels)
+    print(f"→ Model grid: {grid_label}")
     pv.global_theme.allow_empty_mesh = True
-    gp.compute_model(geo_model)
+
+    # Ratkaisu ohitetaan, jos pintapisteet, orientaatiot, hila, DEM ja asetukset ovat ennallaan
+    state, solve_key, geo_model = None, None, None
+    if config.get("project_state_dir"):
+        state = ProjectState(config["project_state_dir"])
+        dem = DemSource(config.get("dem_source", DEFAULT_DEM_PATH))
+        solve_key = state.solve_key([SURFACE_POINTS_CSV, ORIENTATIONS_CSV], bounds=bounds,
+                                    grid=grid_kwargs, config=config, engine=engine_label,
+                                    dem=[file_stamp(t["path"]) for t in dem.tiles])
+        if not force_recompute:
+            geo_model = state.load_solution(solve_key)
+    if geo_model is not None:
+        print("→ Inputs unchanged since the last solve; reusing the stored GemPy solution")
+    else:
+        geo_model = build_geo_model(bounds, grid_kwargs)
+        compute_with_report(geo_model, grid_label, engine_config, threads, profile=profile_solve,
+                            trace_memory=profile_solve)
+        if state is not None:
+            state.save_solution(solve_key, geo_model)
 
     output_folder = "exported_meshes"
     os.makedirs(output_folder, exist_ok=True)
     geo_model.surface_points_copy.df.to_csv(os.path.join(output_folder, "surface_points.csv"), index=False)
     print("Exported surface points to CSV.")
 
-    export_dc_meshes_as_surfaces(geo_model, output_folder)
-
-    gpv.plot_2d(model=geo_model,ve=2, show_data=True, show_scalar=False, show_lith=True, show_topography=True, topography_color="lightgray")
-    gpv.plot_2d(model=geo_model, ve=1, show_topography=True, show_data=True, legend=False)
-    gpv.plot_2d(model=geo_model, ve=3, show_topography=True, show_data=True, legend=False)
-    gpv.plot_2d(model=geo_model, ve=3, show_topography=True, show_data=True, legend=True, scalar_field=False)
-    gpv.plot_2d(model=geo_model, ve=3, show_topography=True, show_data=False, legend=True, show_boundaries=False)
-    gpv.plot_2d(model=geo_model, ve=3, direction='x', show_topography=True, show_data=True, legend=True, show_boundaries=False)
-    gpv.plot_3d(geo_model, ve=1, show_topography=True, show_lith=True, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_topography=True, show_lith=False, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_topography=True, show_lith=True, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_topography=False, show_lith=True, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_topography=False, show_lith=False, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_data=False, show_topography=False, show_lith=True, image=False)
-    gpv.plot_3d(geo_model, ve=1, show_data=False, show_topography=False, show_lith=False, image=False)
-    gpv.plot_3d(geo_model, ve=2, show_topography=False, show_lith=False, image=False)
-    gpv.plot_3d(geo_model, ve=3, show_topography=False, show_lith=False, image=False)   
-    plt.show()
+    export_dc_meshes_as_surfaces(geo_model, output_folder,
+                                 formats=config.get("surface_export_formats", DEFAULT_SURFACE_FORMATS),
+                                 max_workers=config.get("surface_export_workers"))
+    if config.get("grid_surface_export", False):
+        export_unit_bottoms(geo_model, output_folder,
+                            pixel_size=config.get("grid_surface_pixel_size"),
+                            z_step=config.get("grid_surface_z_step"))
+
+    if render_to:
+        render_plots(geo_model, render_to, workers=render_workers)
+    elif show_plots:
+        show_model_plots(geo_model)
+
+    return geo_model
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the GemPy model and export its surfaces.")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="skip all plotting (batch / compute node runs)")
+    parser.add_argument("--render-to", metavar="DIR",
+                        help="render the views off-screen as PNG files into DIR instead of opening viewers")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="parallel render processes (default: CPU count)")
+    parser.add_argument("--force-recompute", action="store_true",
+                        help="solve the model even if its inputs are unchanged since the last run")
+    parser.add_argument("--tile-size", type=float, metavar="M",
+                        help="split the area into tiles of M metres solved in parallel (see 'tiling' in config)")
+    parser.add_argument("--engine-backend", choices=["numpy", "pytorch"],
+                        help="GemPy solver backend (PyTorch runs on the CPU)")
+    parser.add_argument("--dtype", choices=["float32", "float64"],
+                        help="solver floating point precision (default float64)")
+    parser.add_argument("--threads", type=int, help="BLAS / PyTorch threads used by the solver")
+    parser.add_argument("--profile-solve", action="store_true",
+                        help="report how the solve time splits between interpolation, grids and dual contouring")
+    grid = parser.add_mutually_exclusive_group()
+    grid.add_argument("--resolution", nargs="+", metavar="N",
+                      help="model grid as NX NY NZ, or 'auto' (borehole density and extent)")
+    grid.add_argument("--voxel-size", type=float, nargs="+", metavar="M",
+                      help="target voxel size in metres (one value or DX DY DZ)")
+    grid.add_argument("--octree-levels", type=int, help="use GemPy's octree grid with N levels")
+    grid.add_argument("--sweep-voxel-sizes", type=float, nargs="+", metavar="M",
+                      help="compute the model at each voxel size, report time and memory, then exit")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    gempy_main()
+    args = parse_args()
+    resolution = args.resolution
+    if resolution and resolution != ["auto"]:
+        if len(resolution) != 3:
+            raise SystemExit("--resolution expects NX NY NZ or 'auto'")
+        resolution = [int(n) for n in resolution]
+    elif resolution:
+        resolution = "auto"
+    voxel_size = args.voxel_size
+    if voxel_size and len(voxel_size) == 1:
+        voxel_size = voxel_size[0]
+    gempy_main(show_plots=not args.no_plot, render_to=args.render_to, render_workers=args.render_workers,
+               resolution=resolution, voxel_size=voxel_size, octree_levels=args.octree_levels,
+               sweep_voxel_sizes=args.sweep_voxel_sizes, force_recompute=args.force_recompute,
+               tile_size=args.tile_size, engine_backend=args.engine_backend, engine_dtype=args.dtype,
+               engine_threads=args.threads, profile_solve=args.profile_solve)
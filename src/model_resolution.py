@@ -0,0 +1,136 @@
+import cProfile
+import math
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from solver_engine import limit_threads, profile_stages, print_stage_report
+
+DEFAULT_RESOLUTION = [30, 30, 30]
+MIN_CELLS = 10
+MAX_CELLS = 100
+
+
+def _extent_lengths(extent):
+    x_min, x_max, y_min, y_max, z_min, z_max = extent
+    return np.array([x_max - x_min, y_max - y_min, z_max - z_min], dtype=float)
+
+
+def resolution_from_voxel_size(extent, voxel_size, min_cells=MIN_CELLS, max_cells=None):
+    """
+    Hilan resoluutio tavoitevokselikoosta (metreinä). voxel_size voi olla
+    yksi luku tai [dx, dy, dz]. Solujen määrä pyöristetään ylöspäin, jotta
+    vokselit ovat enintään annetun kokoisia, ja jokaiselle akselille tulee
+    vähintään min_cells solua (ohuissa malleissa pystysuunta muuten katoaa).
+    """
+    voxel = np.broadcast_to(np.asarray(voxel_size, dtype=float), (3,))
+    cells = np.ceil(_extent_lengths(extent) / voxel).astype(int)
+    cells = np.maximum(cells, min_cells)
+    if max_cells:
+        cells = np.minimum(cells, max_cells)
+    return [int(c) for c in cells]
+
+
+def auto_resolution(extent, surface_points, min_cells=MIN_CELLS, max_cells=MAX_CELLS):
+    """
+    Resoluutio pistetiheyden mukaan. Vaakasuunnassa kairauspisteiden
+    keskimääräiselle välille (sqrt(pinta-ala / pisteiden määrä)) tulee kaksi
+    vokselia; pystysuunnassa vokseli on puolet saman pisteen peräkkäisten
+    rajapintojen mediaanivälistä. Solumäärät rajataan välille
+    [min_cells, max_cells].
+    """
+    lengths = _extent_lengths(extent)
+    df = pd.DataFrame(surface_points)
+    n_points = max(1, len(df[["X", "Y"]].round(1).drop_duplicates()))
+    spacing = math.sqrt(lengths[0] * lengths[1] / n_points)
+
+    gaps = (df.sort_values(["piste", "Z"]).groupby("piste")["Z"].diff().dropna()
+            if "piste" in df else pd.Series(dtype=float))
+    gaps = gaps[gaps > 0]
+    dz = gaps.median() / 2 if len(gaps) else lengths[2] / DEFAULT_RESOLUTION[2]
+
+    return resolution_from_voxel_size(extent, [spacing / 2, spacing / 2, dz],
+                                      min_cells=min_cells, max_cells=max_cells)
+
+
+def grid_settings(config, extent, surface_points=None, resolution=None, voxel_size=None,
+                  octree_levels=None):
+    """
+    Valitsee mallin hilan asetuksista. Argumentit (esim. komentoriviltä)
+    ohittavat config.json-arvot; järjestys: octree_levels, voxel_size,
+    resolution ("auto" tai [nx, ny, nz]). Palauttaa create_geomodel-kwargsit
+    ja lyhyen kuvauksen raportointia varten.
+    """
+    octree_levels = octree_levels or config.get("model_octree_levels")
+    voxel_size = voxel_size or config.get("model_voxel_size")
+    resolution = resolution or config.get("model_resolution", DEFAULT_RESOLUTION)
+
+    if octree_levels:
+        return {"resolution": None, "refinement": int(octree_levels)}, f"octree levels {int(octree_levels)}"
+    if voxel_size:
+        res = resolution_from_voxel_size(extent, voxel_size)
+        return {"resolution": res}, f"voxel size {voxel_size} m -> resolution {res}"
+    if resolution == "auto":
+        if surface_points is None:
+            raise ValueError("Automatic resolution needs the surface points")
+        res = auto_resolution(extent, surface_points)
+        return {"resolution": res}, f"auto resolution {res}"
+    res = [int(n) for n in resolution]
+    return {"resolution": res}, f"resolution {res}"
+
+
+def compute_with_report(geo_model, label="", engine_config=None, threads=None, profile=False,
+                        trace_memory=False):
+    """
+    Ajaa gp.compute_model ja raportoi laskenta-ajan. engine_config ja
+    threads valitsevat ratkaisijan (ks. solver_engine.engine_settings);
+    profile=True tulostaa lisäksi ajan jakautumisen ratkaisun vaiheisiin.
+    trace_memory=True mittaa Python-muistin huippukäytön tracemallocilla
+    (sisältää NumPy-taulukot, ei PyTorchin tai BLASin omia varauksia). Se
+    hidastaa ratkaisua, joten se on käytössä vain vertailuajoissa.
+    Palauttaa tilastot.
+    """
+    import gempy as gp
+
+    rg = geo_model.grid.regular_grid
+    resolution = [int(n) for n in rg.resolution]
+    lengths = _extent_lengths(rg.extent)
+
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        with limit_threads(engine_config, threads):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                gp.compute_model(geo_model, engine_config=engine_config)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        seconds = time.perf_counter() - t0
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    stats = {
+        "label": label,
+        "resolution": resolution,
+        "cells": int(np.prod(resolution)),
+        "voxel_m": [round(float(v), 2) for v in lengths / resolution],
+        "seconds": round(seconds, 2),
+    }
+    report = (f"→ Model {label or resolution}: {stats['cells']:,} cells, voxel {stats['voxel_m']} m, "
+              f"compute {stats['seconds']} s")
+    if trace_memory:
+        stats["peak_mb"] = round(peak / 1024 / 1024, 1)
+        report += f", peak Python memory {stats['peak_mb']} MB"
+    print(report)
+    if profiler is not None:
+        stats["stages"] = profile_stages(profiler, seconds, geo_model)
+        print_stage_report(stats["stages"], label)
+    return stats
@@ -0,0 +1,174 @@
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from data_processing.build_offsets import borehole_offsets
+
+DEFAULT_STATE_DIR = "aineiston_kasittely/cache/project_state"
+# Konfiguraation avaimet, jotka vaikuttavat kairausten offset-riveihin
+OFFSET_CONFIG_KEYS = ("layers_to_include", "layers_to_ignore", "alias_map")
+# Kairauksen rivit säilytetään, kunnes se on puuttunut näin monesta peräkkäisestä ajosta
+DEFAULT_KEEP_RUNS = 5
+
+
+def borehole_hashes(store) -> np.ndarray:
+    """
+    Kairauskohtainen tiiviste (nro, TY, TT, sijainti, päättymissyvyys ja
+    kerrosrajat). Sama kairaus saa saman tiivisteen tiedostosta riippumatta.
+    """
+    ty = np.array(store.ty_labels, dtype=object)[store.ty_code]
+    tt = np.array(store.tt_labels, dtype=object)[store.tt_code]
+    labels = np.array(store.layer_labels, dtype=object)
+    head = np.column_stack([store.x, store.y, store.z.astype(np.float64),
+                            store.end_depth.astype(np.float64)])
+    offsets = store.layer_offsets
+
+    hashes = np.empty(len(store), dtype=object)
+    for i in range(len(store)):
+        lo, hi = offsets[i], offsets[i + 1]
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{store.nro[i]}\x1f{ty[i]}\x1f{tt[i]}\x1f".encode("utf-8"))
+        h.update(head[i].tobytes())
+        h.update("\x1f".join(labels[store.layer_code[lo:hi]]).encode("utf-8"))
+        h.update(store.layer_depth[lo:hi].tobytes())
+        hashes[i] = h.hexdigest()
+    return hashes
+
+
+def fingerprint(obj) -> str:
+    payload = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def file_stamp(path) -> str:
+    st = Path(path).stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ProjectState:
+    """
+    Projektin tila ajojen välillä: kairauskohtaiset tiivisteet ja niistä
+    lasketut offset-rivit sekä viimeisimmän GemPy-ratkaisun syötteiden
+    tiiviste. Muuttumattomien kairausten rivit otetaan tallennetuista, ja
+    ratkaisu ladataan levyltä, jos sen syötteet ovat ennallaan.
+    """
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR, keep_runs=DEFAULT_KEEP_RUNS):
+        self.dir = Path(state_dir)
+        self.keep_runs = max(1, int(keep_runs))
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._state_path = self.dir / "state.json"
+        self._rows_path = self.dir / "offset_rows.pkl"
+        self._model_path = self.dir / "geo_model.pkl"
+        try:
+            self.state = json.loads(self._state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+
+    def _save_state(self):
+        tmp = self._state_path.with_name(self._state_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.state, indent=1), encoding="utf-8")
+        os.replace(tmp, self._state_path)
+
+    def _save_rows(self, rows):
+        tmp = self._rows_path.with_name(self._rows_path.name + ".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(rows.reset_index(drop=True), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._rows_path)
+
+    def _load_rows(self):
+        try:
+            with self._rows_path.open("rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def incremental_offsets(self, store, config):
+        """
+        Kuten borehole_offsets, mutta offset-rivit lasketaan vain uusille tai
+        muuttuneille kairauksille. Rivien järjestys on sama kuin koko
+        varastosta laskettaessa. Aiempien ajojen kairaukset (esim. toisen
+        kohteen tiedosto) säilyvät välimuistissa keep_runs ajon ajan sen
+        jälkeen, kun ne on viimeksi nähty.
+        """
+        hashes = borehole_hashes(store)
+        cfg_key = fingerprint({k: config.get(k) for k in OFFSET_CONFIG_KEYS})
+        run = int(self.state.get("offset_run", 0)) + 1
+
+        cached = None
+        last_seen = {}
+        if self.state.get("offset_config") == cfg_key:
+            cached = self._load_rows()
+            if cached is not None:
+                last_seen = self.state.get("borehole_last_run")
+                if last_seen is None:
+                    # Vanha tilatiedosto: pelkkä tiivistelista
+                    last_seen = {h: run - 1 for h in self.state.get("borehole_hashes", [])}
+        known = set(last_seen)
+
+        # Sama kairaus voi esiintyä useasti; lasketaan kukin tiiviste kerran
+        first = {}
+        for i, h in enumerate(hashes):
+            if h not in known:
+                first.setdefault(h, i)
+        changed = np.fromiter(first.values(), dtype=np.int64, count=len(first))
+        df_new, _, _ = borehole_offsets(store.take(changed), config, with_index=True)
+        df_new["_hash"] = hashes[changed][df_new.pop("borehole").to_numpy()]
+        print(f"→ Boreholes changed since last run: {len(changed)} / {len(store)}")
+
+        last_seen.update(dict.fromkeys(hashes, run))
+        last_seen = {h: r for h, r in last_seen.items() if r > run - self.keep_runs}
+        if cached is None:
+            rows = df_new
+        else:
+            # Aiempien ajojen rivit säilytetään, jos kairaus on nähty viimeisten keep_runs ajon aikana
+            keep = cached["_hash"].isin(last_seen.keys()) & ~cached["_hash"].isin(first)
+            rows = pd.concat([cached[keep], df_new], ignore_index=True)
+
+        # Kairausten järjestyksessä; sama kairaus useaan kertaan toistaa rivinsä
+        order = pd.DataFrame({"_hash": hashes, "_pos": np.arange(len(hashes))})
+        df = order.merge(rows, on="_hash", how="inner", sort=False)
+        df = df.sort_values("_pos", kind="stable")
+        used = int(df["_pos"].nunique())
+        df = df.drop(columns=["_hash", "_pos"]).reset_index(drop=True).infer_objects()
+
+        self._save_rows(rows)
+        self.state["offset_config"] = cfg_key
+        self.state["offset_run"] = run
+        self.state["borehole_last_run"] = last_seen
+        self.state.pop("borehole_hashes", None)
+        self._save_state()
+        return df, len(store), used
+
+    def solve_key(self, input_paths, **params) -> str:
+        """Ratkaisun syötteiden tiiviste: tiedostojen sisältö ja parametrit."""
+        return fingerprint({"files": [file_sha256(p) for p in input_paths], **params})
+
+    def load_solution(self, key):
+        """Palauttaa tallennetun ratkaistun mallin, jos syötteet ovat ennallaan."""
+        if self.state.get("solve_key") != key or not self._model_path.is_file():
+            return None
+        with self._model_path.open("rb") as f:
+            return pickle.load(f)
+
+    def save_solution(self, key, geo_model):
+        tmp = self._model_path.with_name(self._model_path.name + ".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(geo_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._model_path)
+        self.state["solve_key"] = key
+        self._save_state()
@@ -0,0 +1,114 @@
+import contextlib
+import importlib.util
+import pstats
+
+from gempy_engine.config import AvailableBackends
+from gempy.core.data.gempy_engine_config import GemPyEngineConfig
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+ENGINE_BACKENDS = {"numpy": AvailableBackends.numpy, "pytorch": AvailableBackends.PYTORCH}
+ENGINE_DTYPES = ("float32", "float64")
+
+# GemPy-funktiot, joiden kumulatiivisista ajoista vaiheet lasketaan
+_WEIGHTS_FUNC = "compute_weights"
+_EVALUATION_FUNC = "interpolate_n_octree_levels"
+_DUAL_CONTOURING_FUNC = "dual_contouring_multi_scalar"
+
+
+def engine_settings(config, backend=None, dtype=None, threads=None):
+    """
+    Ratkaisijan asetukset: backend ("numpy" tai "pytorch"), liukulukutarkkuus
+    ("float32" / "float64") ja säikeiden määrä. Argumentit ohittavat
+    config.json-arvot ("engine": {"backend", "dtype", "threads"}). Palauttaa
+    GemPyEngineConfig-olion, säikeiden määrän ja lyhyen kuvauksen.
+    """
+    engine = config.get("engine") or {}
+    backend = (backend or engine.get("backend") or "numpy").lower()
+    dtype = dtype or engine.get("dtype")
+    threads = threads or engine.get("threads")
+
+    if backend not in ENGINE_BACKENDS:
+        raise ValueError(f"Unknown engine backend '{backend}'; choose from {tuple(ENGINE_BACKENDS)}")
+    if dtype is not None and dtype not in ENGINE_DTYPES:
+        raise ValueError(f"Unknown engine dtype '{dtype}'; choose from {ENGINE_DTYPES}")
+    if backend == "pytorch" and importlib.util.find_spec("torch") is None:
+        print("→ PyTorch is not installed; solving with the numpy backend")
+        backend = "numpy"
+
+    engine_config = GemPyEngineConfig(backend=ENGINE_BACKENDS[backend], use_gpu=False, dtype=dtype)
+    label = f"{backend} {dtype or 'float64'}" + (f", {int(threads)} threads" if threads else "")
+    return engine_config, (int(threads) if threads else None), label
+
+
+@contextlib.contextmanager
+def limit_threads(engine_config, threads):
+    """Rajaa BLAS/OpenMP- ja PyTorch-säikeet ratkaisun ajaksi."""
+    if not threads:
+        yield
+        return
+    backend = engine_config.backend if engine_config is not None else AvailableBackends.numpy
+    stack = contextlib.ExitStack()
+    with stack:
+        if backend == AvailableBackends.PYTORCH:
+            import torch
+            previous = torch.get_num_threads()
+            torch.set_num_threads(threads)
+            stack.callback(torch.set_num_threads, previous)
+        if threadpool_limits is not None:
+            stack.enter_context(threadpool_limits(limits=threads))
+        elif backend == AvailableBackends.numpy:
+            print("→ threadpoolctl is not installed; numpy thread count follows OMP_NUM_THREADS")
+        yield
+
+
+def profile_stages(profiler, wall_seconds, geo_model):
+    """
+    Jakaa cProfile-tuloksen ratkaisun vaiheisiin: interpolointi (krigingin
+    painot), hilan/octreen evaluointi, topografia- ja leikkaushilat sekä
+    dual contouring. Topografian ja leikkausten osuus evaluoinnista
+    arvioidaan niiden pisteiden osuutena kaikista evaluoiduista pisteistä,
+    koska GemPy evaluoi kaikki hilat samassa kutsussa.
+    """
+    cumulative = {}
+    for (_, _, name), (_, _, _, ct, _) in pstats.Stats(profiler).stats.items():
+        cumulative[name] = max(cumulative.get(name, 0.0), ct)
+
+    weights = cumulative.get(_WEIGHTS_FUNC, 0.0)
+    evaluation = max(cumulative.get(_EVALUATION_FUNC, 0.0) - weights, 0.0)
+    dual_contouring = cumulative.get(_DUAL_CONTOURING_FUNC, 0.0)
+
+    topo_points = section_points = 0
+    total_points = 0
+    octrees = geo_model.solutions.octrees_output if geo_model.solutions is not None else []
+    for level, octree in enumerate(octrees):
+        grid = octree.outputs_centers[0].grid
+        total_points += len(grid.values)
+        if level == 0:
+            topo_points = len(grid.topography.values) if grid.topography is not None else 0
+            section_points = len(grid.sections.values) if grid.sections is not None else 0
+    total_points = max(total_points, 1)
+    topography = evaluation * topo_points / total_points
+    sections = evaluation * section_points / total_points
+
+    stages = {
+        "interpolation": weights,
+        "octree evaluation": evaluation - topography - sections,
+        "topography grid": topography,
+        "section grid": sections,
+        "dual contouring": dual_contouring,
+    }
+    stages["other"] = max(wall_seconds - sum(stages.values()), 0.0)
+    return {name: round(seconds, 3) for name, seconds in stages.items()}
+
+
+def print_stage_report(stages, label=""):
+    total = sum(stages.values()) or 1.0
+    print(f"--- Solve profile {label} ---".rstrip())
+    for name, seconds in stages.items():
+        print(f"{name:>18}: {seconds:8.3f} s  {seconds / total:6.1%}")
+    print("------------------------")
+
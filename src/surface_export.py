@@ -0,0 +1,408 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+
+# 3DFACE-kulmien ryhmäkoodit (x, y, z) järjestyksessä; kolmion neljäs kulma = kolmas
+_FACE_CODES = np.array(["10", "20", "30", "11", "21", "31", "12", "22", "32", "13", "23", "33"])
+_DXF_HEADER = "0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n0\nENDSEC\n0\nSECTION\n2\nENTITIES\n"
+_DXF_FOOTER = "0\nENDSEC\n0\nEOF\n"
+
+SURFACE_FORMATS = ("obj", "vtp", "dxf", "tif", "glb", "ply")
+DEFAULT_SURFACE_FORMATS = ("obj", "vtp", "dxf", "tif")
+
+
+def _format_fixed(values, decimals):
+    # Kiinteä desimaalimäärä kokonaislukuaritmetiikalla (nopeampi kuin float -> str)
+    scale = 10 ** decimals
+    q = np.round(values * scale).astype(np.int64)
+    mag = np.abs(q)
+    sign = np.where(q < 0, "-", "")
+    whole = np.char.add(sign, (mag // scale).astype(str))
+    if decimals == 0:
+        return whole
+    frac = np.char.zfill((mag % scale).astype(str), decimals)
+    return np.char.add(np.char.add(whole, "."), frac)
+
+
+def write_dxf_3dfaces(vertices, faces, dxf_path, layer="0", decimals=None, chunk_size=200_000):
+    """
+    Kirjoittaa kolmioverkon DXF R12 -tiedostoon 3DFACE-entiteetteinä.
+    Koordinaatit muotoillaan NumPy-taulukkoina palasittain, joten
+    entiteettejä ei luoda Pythonissa yksi kerrallaan. decimals=None
+    kirjoittaa koordinaatit täydellä tarkkuudella; kokonaisluku pyöristää
+    annettuun desimaalimäärään (nopeampi muotoilu).
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    entity_head = f"0\n3DFACE\n8\n{layer}\n"
+    code_prefix = np.char.add(_FACE_CODES, "\n")
+
+    with open(dxf_path, "w", encoding="ascii", newline="\n") as f:
+        f.write(_DXF_HEADER)
+        for start in range(0, len(faces), chunk_size):
+            tri = faces[start:start + chunk_size]
+            corners = vertices[tri[:, [0, 1, 2, 2]]].reshape(len(tri), 12)
+            values = corners.astype(str) if decimals is None else _format_fixed(corners, decimals)
+            rows = np.empty((len(tri), 13), dtype=object)
+            rows[:, 0] = entity_head
+            rows[:, 1:] = np.char.add(np.char.add(code_prefix, values), "\n")
+            f.write("".join(rows.ravel().tolist()))
+        f.write(_DXF_FOOTER)
+
+
+def mesh_triangles(surface):
+    """PolyData-pinnan kärkipisteet (n, 3) ja kolmiot (m, 3) NumPy-taulukkoina."""
+    surface = surface if surface.is_all_triangles else surface.triangulate()
+    return np.asarray(surface.points, dtype=np.float64), surface.faces.reshape(-1, 4)[:, 1:]
+
+
+def rasterize_triangles(vertices, triangles, x_min, y_max, pixel_size, width, height,
+                        nodata=np.nan, block_rows=256):
+    """
+    Polttaa kolmioverkon säännölliseen float32-hilaan barysentrisellä
+    (tasomaisella) interpoloinnilla. Näytepisteet ovat x_min + j * pixel_size
+    ja y_max - i * pixel_size (sama hila kuin aiemmassa griddata-toteutuksessa).
+    Kolmiot käydään läpi pikseliriveittäin (scanline), ja hila käsitellään
+    block_rows rivin paloissa, joten välitaulukoiden koko pysyy rajattuna.
+    Verkon ulkopuoliset solut saavat arvon nodata.
+    """
+    v = np.asarray(vertices, dtype=np.float64)
+    tri = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    out = np.full((height, width), nodata, dtype=np.float32)
+    if len(tri) == 0:
+        return out
+
+    # Pikselikoordinaatit: sarake c = (x - x_min) / ps, rivi r = (y_max - y) / ps
+    c = (v[tri, 0] - x_min) / pixel_size
+    r = (y_max - v[tri, 1]) / pixel_size
+    z = v[tri, 2]
+
+    # Kolmion taso z = zc * c + zr * r + z0 (barysentrinen interpolointi)
+    dc1, dc2 = c[:, 1] - c[:, 0], c[:, 2] - c[:, 0]
+    dr1, dr2 = r[:, 1] - r[:, 0], r[:, 2] - r[:, 0]
+    dz1, dz2 = z[:, 1] - z[:, 0], z[:, 2] - z[:, 0]
+    det = dc1 * dr2 - dc2 * dr1
+    keep = np.abs(det) > 1e-12
+    c, r, z, det = c[keep], r[keep], z[keep], det[keep]
+    dc1, dc2, dr1, dr2, dz1, dz2 = (a[keep] for a in (dc1, dc2, dr1, dr2, dz1, dz2))
+    zc = (dz1 * dr2 - dz2 * dr1) / det
+    zr = (dc1 * dz2 - dc2 * dz1) / det
+    z0 = z[:, 0] - zc * c[:, 0] - zr * r[:, 0]
+
+    eps = 1e-9
+    r_lo = np.maximum(np.ceil(r.min(axis=1) - eps), 0).astype(np.int64)
+    r_hi = np.minimum(np.floor(r.max(axis=1) + eps), height - 1).astype(np.int64)
+    edges = ((0, 1), (1, 2), (2, 0))
+    flat_out = out.reshape(-1)
+
+    for b0 in range(0, height, block_rows):
+        b1 = min(height, b0 + block_rows)
+        sel = np.flatnonzero((r_hi >= b0) & (r_lo < b1) & (r_hi >= r_lo))
+        if sel.size == 0:
+            continue
+        first = np.maximum(r_lo[sel], b0)
+        n_rows = np.minimum(r_hi[sel], b1 - 1) - first + 1
+
+        # Kolmio-rivi-parit ja kunkin rivin leikkausväli [x_left, x_right]
+        t = np.repeat(sel, n_rows)
+        row = np.repeat(first - np.cumsum(n_rows) + n_rows, n_rows) + np.arange(n_rows.sum())
+        left = np.full(t.size, np.inf)
+        right = np.full(t.size, -np.inf)
+        for i, j in edges:
+            ri, rj, ci, cj = r[t, i], r[t, j], c[t, i], c[t, j]
+            lo, hi = np.minimum(ri, rj), np.maximum(ri, rj)
+            hit = (row >= lo - eps) & (row <= hi + eps) & (hi > lo)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x = ci + (row - ri) * (cj - ci) / (rj - ri)
+            left = np.where(hit, np.minimum(left, x), left)
+            right = np.where(hit, np.maximum(right, x), right)
+        col0 = np.maximum(np.ceil(left - eps), 0).astype(np.int64)
+        col1 = np.minimum(np.floor(right + eps), width - 1).astype(np.int64)
+        n_cols = np.maximum(col1 - col0 + 1, 0)
+
+        # Rivin sisällä z kasvaa lineaarisesti sarakkeen mukana
+        owner = np.repeat(np.arange(t.size), n_cols)
+        col = np.repeat(col0 - np.cumsum(n_cols) + n_cols, n_cols) + np.arange(n_cols.sum())
+        tt = t[owner]
+        flat_out[row[owner] * width + col] = z0[tt] + zr[tt] * row[owner] + zc[tt] * col
+    return out
+
+
+def raster_surface(band, transform, nodata=-9999):
+    """
+    Rasterista kolmioverkko (PolyData): kärkipisteet hilan näytepisteissä
+    transform * (sarake, rivi), kaksi kolmiota jokaista ruutua kohden,
+    jonka kaikki neljä kulmaa ovat kelvollisia.
+    """
+    import pyvista as pv
+
+    band = np.asarray(band, dtype=np.float64)
+    rows, cols = band.shape
+    valid = np.isfinite(band) & (band != nodata)
+    ii, jj = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    xs = transform.c + transform.a * jj
+    ys = transform.f + transform.e * ii
+    points = np.column_stack([xs.ravel(), ys.ravel(), band.ravel()])
+
+    idx = np.arange(rows * cols).reshape(rows, cols)
+    a, b = idx[:-1, :-1], idx[:-1, 1:]
+    c, d = idx[1:, :-1], idx[1:, 1:]
+    quad_ok = (valid[:-1, :-1] & valid[:-1, 1:] & valid[1:, :-1] & valid[1:, 1:]).ravel()
+    tris = np.concatenate([
+        np.column_stack([a.ravel(), c.ravel(), b.ravel()])[quad_ok],
+        np.column_stack([b.ravel(), c.ravel(), d.ravel()])[quad_ok],
+    ])
+    faces = np.column_stack([np.full(len(tris), 3), tris]).ravel()
+    surface = pv.PolyData(points, faces=faces)
+    return surface.clean() if len(tris) else surface
+
+
+def write_raster_tif(band, transform, tif_path, nodata_val=-9999, crs_epsg=3067):
+    """Kirjoittaa yksikaistaisen float32-rasterin GeoTIFFiksi."""
+    with rasterio.open(
+        tif_path, "w",
+        driver="GTiff",
+        height=band.shape[0],
+        width=band.shape[1],
+        count=1,
+        dtype="float32",
+        crs=CRS.from_epsg(crs_epsg),
+        transform=transform,
+        nodata=nodata_val
+    ) as dst:
+        dst.write(band.astype("float32", copy=False), 1)
+
+
+def write_surface_tif(surface, tif_path, pixel_size=2.0, nodata_val=-9999, crs_epsg=3067,
+                      vertices=None, triangles=None):
+    """
+    Rasteroi pinnan GeoTIFFiksi (ks. rasterize_triangles). Jos vertices ja
+    triangles annetaan, surface voi olla None (laajuus kärkipisteistä).
+    """
+    if vertices is None or triangles is None:
+        vertices, triangles = mesh_triangles(surface)
+    x_min, y_min = vertices[:, :2].min(axis=0)
+    x_max, y_max = vertices[:, :2].max(axis=0)
+    width = len(np.arange(x_min, x_max, pixel_size))
+    height = len(np.arange(y_max, y_min, -pixel_size))
+    grid_z = rasterize_triangles(vertices, triangles, x_min, y_max, pixel_size, width, height,
+                                 nodata=nodata_val)
+    write_raster_tif(grid_z, from_origin(x_min, y_max, pixel_size, pixel_size), tif_path,
+                     nodata_val=nodata_val, crs_epsg=crs_epsg)
+
+
+def _write_vtk(surface, vertices, triangles, path, **_):
+    surface.save(path)
+
+
+def _write_dxf(surface, vertices, triangles, path, **_):
+    write_dxf_3dfaces(vertices, triangles, path)
+
+
+def _write_tif(surface, vertices, triangles, path, tif_pixel_size=2.0, **_):
+    write_surface_tif(surface, path, pixel_size=tif_pixel_size, vertices=vertices, triangles=triangles)
+
+
+def _write_trimesh(surface, vertices, triangles, path, **_):
+    import trimesh
+    trimesh.Trimesh(vertices=vertices, faces=triangles, process=False).export(path)
+
+
+_WRITERS = {
+    "obj": _write_vtk,
+    "vtp": _write_vtk,
+    "dxf": _write_dxf,
+    "tif": _write_tif,
+    "glb": _write_trimesh,
+    "ply": _write_trimesh,
+}
+
+# VTK-kirjoittimet käyttävät PolyData-oliota, joka ei ole säieturvallinen
+_VTK_FORMATS = {"obj", "vtp"}
+
+
+def export_surfaces(surfaces, output_folder="exported_meshes", formats=DEFAULT_SURFACE_FORMATS,
+                    max_workers=None, tif_pixel_size=2.0):
+    """
+    Kirjoittaa muistissa olevat pinnat ({nimi: PolyData}) valittuihin
+    formaatteihin. Kolmiot puretaan kerran pintaa kohden NumPy-taulukoiksi;
+    niitä käyttävät kirjoittimet (dxf, tif, glb, ply) ajetaan rinnakkain
+    säiepoolissa, VTK-kirjoittimet (obj, vtp) peräkkäin kutsujan säikeessä.
+    Tiedostoja ei lueta uudelleen levyltä. Palauttaa {nimi: {formaatti: polku}}.
+    """
+    formats = [f.lower().lstrip(".") for f in formats]
+    unknown = sorted(set(formats) - set(SURFACE_FORMATS))
+    if unknown:
+        raise ValueError(f"Unknown surface export format(s) {unknown}; choose from {SURFACE_FORMATS}")
+    os.makedirs(output_folder, exist_ok=True)
+
+    def record(name, fmt, path, write):
+        try:
+            write()
+        except Exception as e:
+            print(f"Error writing {fmt.upper()} for surface '{name}': {e}")
+            return
+        written[name][fmt] = path
+
+    t0 = time.perf_counter()
+    written = {name: {} for name in surfaces}
+    jobs = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for name, surface in surfaces.items():
+            vertices, triangles = mesh_triangles(surface)
+            vertices, triangles = vertices.copy(), triangles.copy()
+            for fmt in formats:
+                if fmt in _VTK_FORMATS:
+                    continue
+                path = os.path.join(output_folder, f"{name}_surface.{fmt}")
+                future = pool.submit(_WRITERS[fmt], None, vertices, triangles, path,
+                                     tif_pixel_size=tif_pixel_size)
+                jobs[future] = (name, fmt, path)
+        for name, surface in surfaces.items():
+            for fmt in formats:
+                if fmt in _VTK_FORMATS:
+                    path = os.path.join(output_folder, f"{name}_surface.{fmt}")
+                    record(name, fmt, path, lambda: _WRITERS[fmt](surface, None, None, path))
+        for future in as_completed(jobs):
+            name, fmt, path = jobs[future]
+            record(name, fmt, path, future.result)
+
+    for name, paths in written.items():
+        print(f"Surface '{name}' saved as:")
+        for fmt in formats:
+            if fmt in paths:
+                print(f"  {fmt.upper()}: {paths[fmt]}")
+    print(f"→ Exported {len(surfaces)} surface(s) × {len(formats)} format(s) "
+          f"in {time.perf_counter() - t0:.2f} s")
+    return written
+
+
+def unit_bottoms_from_lith(lith, z_min, dz, ids, nodata=np.nan):
+    """
+    Yksiköiden pohjan korkeus sarakkeittain. lith on (nx, ny, nz)
+    -litologiataulukko (z kasvaa kolmannella akselilla, solujen keskipisteet
+    z_min + (k + 0.5) * dz). Pohja on alimman yksikköön kuuluvan solun
+    alareuna; sarakkeet, joissa yksikköä ei ole, saavat arvon nodata.
+    Palauttaa {id: (nx, ny) float32}.
+    """
+    lith = np.rint(lith).astype(np.int64)
+    bottoms = {}
+    for unit_id in ids:
+        mask = lith == unit_id
+        k = mask.argmax(axis=2)
+        bottom = (z_min + k * dz).astype(np.float32)
+        bottom[~mask.any(axis=2)] = nodata
+        bottoms[unit_id] = bottom
+    return bottoms
+
+
+def unit_bottom_rasters(geo_model, pixel_size=None, z_step=None, nodata=-9999):
+    """
+    Mallin yksiköiden pohjapinnat rasterina suoraan GemPyn litologiasta,
+    ilman kolmiointia. pixel_size=None käyttää jo laskettua säännöllistä
+    hilaa (pikseli = vokselin vaakakoko, ei uutta ratkaisua). Muuten malli
+    arvioidaan custom-hilassa pikselien keskipisteissä ja z_step-välein;
+    tämä on selvästi raskaampaa (laskenta-aika kasvaa pisteiden määrän
+    mukana), ja mallin aiemmat ratkaisut palautetaan lopuksi.
+    Palauttaa ({nimi: band}, transform), band rivit pohjoisesta etelään.
+    """
+    rg = geo_model.grid.regular_grid
+    x_min, x_max, y_min, y_max, z_min, z_max = (float(v) for v in rg.extent)
+    names = [e.name for e in geo_model.structural_frame.structural_elements]
+    ids = range(1, len(names) + 1)
+
+    if pixel_size is None:
+        nx, ny, nz = (int(n) for n in rg.resolution)
+        dx, dy, dz = (x_max - x_min) / nx, (y_max - y_min) / ny, (z_max - z_min) / nz
+        lith = np.asarray(geo_model.solutions.raw_arrays.lith_block).reshape(nx, ny, nz)
+    else:
+        import gempy as gp
+        dx = dy = float(pixel_size)
+        dz = float(z_step) if z_step else (z_max - z_min) / int(rg.resolution[2])
+        xs = np.arange(x_min + dx / 2, x_max, dx)
+        ys = np.arange(y_min + dy / 2, y_max, dy)
+        zs = np.arange(z_min + dz / 2, z_max, dz)
+        xyz = np.stack(np.meshgrid(xs, ys, zs, indexing="ij"), axis=-1).reshape(-1, 3)
+        print(f"→ Evaluating lithology at {len(xs)}×{len(ys)} columns × {len(zs)} levels "
+              f"({len(xyz):,} points)")
+
+        solutions, active = geo_model.solutions, geo_model.grid.active_grids
+        try:
+            gp.set_custom_grid(geo_model.grid, xyz, reset=True)
+            lith = np.asarray(gp.compute_model(geo_model).raw_arrays.custom)
+        finally:
+            geo_model.grid.active_grids = active
+            geo_model.solutions = solutions
+        lith = lith.reshape(len(xs), len(ys), len(zs))
+        y_max = y_min + len(ys) * dy
+
+    bottoms = unit_bottoms_from_lith(lith, z_min, dz, ids, nodata=nodata)
+    # (x, y) -> rasterin rivit pohjoisesta etelään
+    bands = {names[i - 1]: bottoms[i].T[::-1] for i in ids}
+    return bands, from_origin(x_min, y_max, dx, dy)
+
+
+def export_unit_bottoms(geo_model, output_folder="exported_meshes", pixel_size=None, z_step=None,
+                        nodata_val=-9999, crs_epsg=3067, skip=("kallio", "basement")):
+    """Kirjoittaa yksiköiden pohjapinnat tiedostoihin <nimi>_bottom.tif."""
+    os.makedirs(output_folder, exist_ok=True)
+    bands, transform = unit_bottom_rasters(geo_model, pixel_size=pixel_size, z_step=z_step,
+                                           nodata=nodata_val)
+    written = {}
+    for name, band in bands.items():
+        if name.lower() in skip:
+            continue
+        path = os.path.join(output_folder, f"{name}_bottom.tif")
+        write_raster_tif(band, transform, path, nodata_val=nodata_val, crs_epsg=crs_epsg)
+        written[name] = path
+        print(f"Saved unit bottom TIF: {path}")
+    return written
+
+
+def _write_dxf_per_face(vertices, faces, dxf_path):
+    # Aiempi toteutus (ezdxf, yksi add_3dface per kolmio) vertailua varten
+    import ezdxf
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    for face in faces:
+        pts = [vertices[i] for i in face]
+        if len(pts) == 3:
+            msp.add_3dface([pts[0], pts[1], pts[2]])
+    doc.saveas(dxf_path)
+
+
+def benchmark_dxf(obj_path="exported_meshes/Mr_surface.obj", repeat=3):
+    """Vertaa per-kolmio-ezdxf-kirjoitusta ja write_dxf_3dfaces-kirjoitusta."""
+    import tempfile
+    import trimesh
+
+    mesh = trimesh.load(obj_path)
+    vertices, faces = np.asarray(mesh.vertices), np.asarray(mesh.faces)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        writers = (
+            ("ezdxf per face", _write_dxf_per_face),
+            ("bulk 3DFACE", write_dxf_3dfaces),
+            ("bulk 3DFACE, 4 decimals", lambda v, f, p: write_dxf_3dfaces(v, f, p, decimals=4)),
+        )
+        for name, fn in writers:
+            out = os.path.join(tmp, "bench.dxf")
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn(vertices, faces, out)
+                best = min(best, time.perf_counter() - t0)
+            results[name] = best
+            print(f"→ {name}: {len(faces)} faces in {best * 1000:.1f} ms "
+                  f"({len(faces) / best:,.0f} faces/s)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_dxf(*sys.argv[1:2])
@@ -0,0 +1,230 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from rasterio.transform import from_origin
+
+from model_resolution import grid_settings, compute_with_report
+from surface_export import (rasterize_triangles, raster_surface, write_raster_tif, export_surfaces,
+                            mesh_triangles, DEFAULT_SURFACE_FORMATS)
+
+DEFAULT_TILE_SIZE = 1000.0
+DEFAULT_TILE_OVERLAP = 100.0
+DEFAULT_PIXEL_SIZE = 2.0
+DEFAULT_WORK_DIR = "aineiston_kasittely/cache/tiles"
+
+
+def plan_tiles(bounds, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP):
+    """
+    Jakaa mallin XY-alueen tile_size-kokoisiin ruutuihin. Jokaista ruutua
+    laajennetaan overlap metriä joka suuntaan (koko alueen sisällä), jotta
+    naapuriruutujen pinnat voidaan liukuvasti yhdistää päällekkäisellä
+    vyöhykkeellä.
+    """
+    x_min, x_max, y_min, y_max = bounds[:4]
+    nx = max(1, math.ceil((x_max - x_min) / tile_size))
+    ny = max(1, math.ceil((y_max - y_min) / tile_size))
+    step_x = (x_max - x_min) / nx
+    step_y = (y_max - y_min) / ny
+
+    tiles = []
+    for j in range(ny):
+        for i in range(nx):
+            cx0, cx1 = x_min + i * step_x, x_min + (i + 1) * step_x
+            cy0, cy1 = y_min + j * step_y, y_min + (j + 1) * step_y
+            tiles.append({
+                "name": f"tile_{i}_{j}",
+                "core": (cx0, cx1, cy0, cy1),
+                "bounds": (max(x_min, cx0 - overlap), min(x_max, cx1 + overlap),
+                           max(y_min, cy0 - overlap), min(y_max, cy1 + overlap)),
+            })
+    return tiles
+
+
+def _format_extent(extent):
+    return "X {:.1f}..{:.1f}, Y {:.1f}..{:.1f}".format(*extent)
+
+
+def _grid_window(tile_bounds, x0, y1, pixel_size, width, height):
+    # Ruudun kattama osa koko alueen pikselihilasta (näytepisteet x0 + j*ps, y1 - i*ps)
+    tx0, tx1, ty0, ty1 = tile_bounds
+    col0 = max(0, math.ceil((tx0 - x0) / pixel_size - 1e-9))
+    col1 = min(width - 1, math.floor((tx1 - x0) / pixel_size + 1e-9))
+    row0 = max(0, math.ceil((y1 - ty1) / pixel_size - 1e-9))
+    row1 = min(height - 1, math.floor((y1 - ty0) / pixel_size + 1e-9))
+    return row0, col0, row1 - row0 + 1, col1 - col0 + 1
+
+
+def tile_orientations(orientations, tile_bounds):
+    """
+    Ruudun orientaatiot: laajennetun ruudun alueella olevat. Jos jollekin
+    muodostumalle ei jää yhtään (esim. centroid-tilassa yksi orientaatio
+    muodostumaa kohden), otetaan ruudun keskipistettä lähin, jotta ruudun
+    mallissa on samat pinnat kuin koko alueen mallissa.
+    """
+    tx0, tx1, ty0, ty1 = tile_bounds
+    inside = orientations["X"].between(tx0, tx1) & orientations["Y"].between(ty0, ty1)
+    parts = [orientations[inside]]
+    cx, cy = (tx0 + tx1) / 2, (ty0 + ty1) / 2
+    for formation in orientations["formation"].unique():
+        candidates = orientations[orientations["formation"] == formation]
+        if candidates.empty or inside[candidates.index].any():
+            continue
+        dist = np.hypot(candidates["X"] - cx, candidates["Y"] - cy)
+        parts.append(candidates.loc[[dist.idxmin()]])
+    return pd.concat(parts).sort_index()
+
+
+def solve_tile(tile, z_range, grid_args, grid, work_dir, surface_points_csv, orientations_csv,
+               engine_config=None, threads=None, profile=False, config=None):
+    """
+    Ratkaisee yhden ruudun GemPy-mallin omassa prosessissaan ja rasteroi sen
+    pinnat koko alueen pikselihilan ruudun kohdalle. Palauttaa ruudun
+    tilastot ja {pinta: (row0, col0, band)}; band on float32, NaN = ei pintaa.
+    """
+    from gem import build_geo_model, dc_mesh_surfaces
+
+    t0 = time.perf_counter()
+    x0, y1, pixel_size, width, height = grid
+    tx0, tx1, ty0, ty1 = tile["bounds"]
+    points = pd.read_csv(surface_points_csv)
+    points = points[points["X"].between(tx0, tx1) & points["Y"].between(ty0, ty1)]
+    result = {"name": tile["name"], "points": len(points), "surfaces": {}}
+    if points.empty:
+        result["empty"] = True
+        return result
+
+    tile_dir = os.path.join(work_dir, tile["name"])
+    os.makedirs(tile_dir, exist_ok=True)
+    tile_points_csv = os.path.join(tile_dir, "offset_data.csv")
+    points.to_csv(tile_points_csv, index=False)
+    tile_orientations_csv = os.path.join(tile_dir, "orientation_offset.csv")
+    tile_orientations(pd.read_csv(orientations_csv), tile["bounds"]).to_csv(tile_orientations_csv, index=False)
+
+    tile_bounds = (tx0, tx1, ty0, ty1, *z_range)
+    try:
+        grid_kwargs, label = grid_settings(config or {}, tile_bounds, points, **grid_args)
+        geo_model = build_geo_model(tile_bounds, grid_kwargs, surface_points_csv=tile_points_csv,
+                                    orientations_csv=tile_orientations_csv)
+        result["stats"] = compute_with_report(geo_model, f"{tile['name']} {label}", engine_config, threads,
+                                              profile=profile, trace_memory=profile)
+        surfaces = dc_mesh_surfaces(geo_model)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    row0, col0, rows, cols = _grid_window(tile["bounds"], x0, y1, pixel_size, width, height)
+    for name, surface in surfaces.items():
+        vertices, triangles = mesh_triangles(surface)
+        band = rasterize_triangles(vertices, triangles, x0 + col0 * pixel_size,
+                                   y1 - row0 * pixel_size, pixel_size, cols, rows)
+        result["surfaces"][name] = (row0, col0, band)
+    result["seconds"] = round(time.perf_counter() - t0, 2)
+    return result
+
+
+def blend_weights(tile, bounds, row0, col0, rows, cols, x0, y1, pixel_size, overlap):
+    """
+    Painot ruudun pikseleille: 1 ruudun sisäosassa, laskee lineaarisesti
+    kohti laajennetun ruudun reunaa päällekkäisellä vyöhykkeellä. Koko
+    alueen reunalla naapuria ei ole, joten siellä paino pysyy 1:ssä.
+    """
+    tx0, tx1, ty0, ty1 = tile["bounds"]
+    xs = x0 + (col0 + np.arange(cols)) * pixel_size
+    ys = y1 - (row0 + np.arange(rows)) * pixel_size
+    inf = np.full(cols, np.inf)
+    dx = np.minimum(xs - tx0 if tx0 > bounds[0] else inf, tx1 - xs if tx1 < bounds[1] else inf)
+    inf = np.full(rows, np.inf)
+    dy = np.minimum(ys - ty0 if ty0 > bounds[2] else inf, ty1 - ys if ty1 < bounds[3] else inf)
+    ramp = max(overlap * 2, pixel_size)
+    return np.clip(np.minimum(dy[:, None], dx[None, :]) / ramp, 1e-3, 1.0)
+
+
+def run_tiled(bounds, output_folder="exported_meshes", tile_size=DEFAULT_TILE_SIZE,
+              overlap=DEFAULT_TILE_OVERLAP, workers=None, pixel_size=DEFAULT_PIXEL_SIZE,
+              grid_args=None, formats=DEFAULT_SURFACE_FORMATS,
+              surface_points_csv="aineiston_kasittely/output_data/offset_data.csv",
+              orientations_csv="aineiston_kasittely/output_data/orientation_offset.csv",
+              nodata_val=-9999, work_dir=DEFAULT_WORK_DIR, engine_config=None, threads=None,
+              profile=False, config=None):
+    """
+    Ruuduttaa mallin: jokainen ruutu ratkaistaan erillisessä prosessissa,
+    ja ruutujen pinnat yhdistetään painotettuna keskiarvona yhteiseen
+    rasteriin (<nimi>_surface.tif). Yhdistetyistä rastereista muodostetaan
+    kolmioverkot muihin valittuihin formaatteihin. Jos jonkin ruudun
+    ratkaisu epäonnistuu, puuttuvat ruudut tulostetaan ja nostetaan
+    RuntimeError ennen kuin vajaita pintoja kirjoitetaan.
+    """
+    x_min, x_max, y_min, y_max, z_min, z_max = bounds
+    tiles = plan_tiles(bounds, tile_size, overlap)
+    width = len(np.arange(x_min, x_max, pixel_size))
+    height = len(np.arange(y_max, y_min, -pixel_size))
+    grid = (x_min, y_max, pixel_size, width, height)
+    os.makedirs(work_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tiles)))
+    print(f"→ Tiled model: {len(tiles)} tiles of {tile_size} m (+{overlap} m overlap), {workers} workers")
+
+    t0 = time.perf_counter()
+    sums, weights = {}, {}
+    failed, empty = [], []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(solve_tile, tile, (z_min, z_max), grid_args or {}, grid, work_dir,
+                               surface_points_csv, orientations_csv, engine_config, threads, profile, config): tile
+                   for tile in tiles}
+        for future in as_completed(futures):
+            tile = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            if result.get("empty"):
+                print(f"→ {tile['name']}: no surface points, left empty")
+                empty.append(tile)
+                continue
+            if "error" in result:
+                print(f"→ {tile['name']} failed: {result['error']}")
+                failed.append((tile, result["error"]))
+                continue
+            print(f"→ {tile['name']}: {result['points']} points, {result['seconds']} s")
+            for name, (row0, col0, band) in result["surfaces"].items():
+                rows, cols = band.shape
+                if name not in sums:
+                    sums[name] = np.zeros((height, width))
+                    weights[name] = np.zeros((height, width))
+                w = blend_weights(tile, bounds, row0, col0, rows, cols, x_min, y_max, pixel_size, overlap)
+                w = np.where(np.isnan(band), 0.0, w)
+                window = (slice(row0, row0 + rows), slice(col0, col0 + cols))
+                sums[name][window] += w * np.nan_to_num(band)
+                weights[name][window] += w
+
+    if empty:
+        print(f"→ {len(empty)} tile(s) without surface points have no surface: "
+              + ", ".join(f"{t['name']} {_format_extent(t['core'])}" for t in empty))
+    if failed:
+        for tile, error in failed:
+            print(f"→ Missing tile {tile['name']} {_format_extent(tile['core'])}: {error}")
+        raise RuntimeError(f"{len(failed)} of {len(tiles)} tiles failed; stitched surfaces were not written")
+
+    os.makedirs(output_folder, exist_ok=True)
+    transform = from_origin(x_min, y_max, pixel_size, pixel_size)
+    surfaces, written = {}, {}
+    for name in sums:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            band = np.where(weights[name] > 0, sums[name] / weights[name], nodata_val).astype(np.float32)
+        if "tif" in formats:
+            path = os.path.join(output_folder, f"{name}_surface.tif")
+            write_raster_tif(band, transform, path, nodata_val=nodata_val)
+            written[name] = {"tif": path}
+            print(f"Saved stitched TIF: {path}")
+        surfaces[name] = raster_surface(band, transform, nodata=nodata_val)
+
+    mesh_formats = [f for f in formats if f != "tif"]
+    if mesh_formats and surfaces:
+        for name, paths in export_surfaces(surfaces, output_folder, formats=mesh_formats).items():
+            written.setdefault(name, {}).update(paths)
+    print(f"→ Tiled model finished in {time.perf_counter() - t0:.1f} s")
+    return written
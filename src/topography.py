@@ -1,43 +1,79 @@
 import gempy as gp
+import numpy as np
 
-import rasterio
-from rasterio.windows import from_bounds
 from rasterio.transform import Affine
+from gempy.core.data import Grid
+from gempy.core.data.grid_modules.topography import Topography
 
-def set_topography(geo_model, x_min, x_max, y_min, y_max, z_min, downsample_factor=1):
-    input_path = 'aineiston_kasittely/input_data/korkeusmalliL3342CDEF.tif'
-    output_path = 'aineiston_kasittely/input_data/L3324D_2_no_nodata.tif'
+from utils.dem_tiles import DemSource, DEFAULT_DEM_PATH
 
-    with rasterio.open(input_path) as src:
-        window = from_bounds(x_min, y_min, x_max, y_max, src.transform)
-        transform = src.window_transform(window)
-        band1 = src.read(1, window=window)
+def set_topography_from_array(grid, band, transform):
+    # Pikselien keskipisteet; GemPy odottaa (x, y)-indeksoidun taulukon, y kasvavana
+    rows, cols = band.shape
+    xs = transform.c + transform.a * (np.arange(cols) + 0.5)
+    ys = transform.f + transform.e * (np.arange(rows) + 0.5)
+    if transform.e < 0:
+        ys = ys[::-1]
+        band = band[::-1, :]
+    x_vals, y_vals = np.meshgrid(xs, ys, indexing='ij')
+    values_2d = np.stack([x_vals, y_vals, band.T.astype(float)], axis=-1)
 
-        # Korvaa nodata-arvot
-        nodata = src.nodata
-        band1[band1 == nodata] = z_min
+    grid.topography = Topography(_regular_grid=grid.regular_grid, values_2d=values_2d)
+    gp.set_active_grid(grid, [Grid.GridTypes.TOPOGRAPHY])
+    return grid.topography
+
+def auto_downsample_factor(geo_model, dem_res, cells_per_voxel=2):
+    """
+    Harvennuskerroin mallin hilan mukaan: korkeusmallin pikseli saa olla
+    enintään 1/cells_per_voxel vokselin vaakakoosta.
+    """
+    extent = geo_model.grid.regular_grid.extent
+    resolution = geo_model.grid.regular_grid.resolution
+    voxel = min((extent[1] - extent[0]) / resolution[0], (extent[3] - extent[2]) / resolution[1])
+    return max(1, int(voxel / cells_per_voxel // dem_res))
+
+def set_topography(geo_model, x_min, x_max, y_min, y_max, z_min, downsample_factor="auto",
+                   dem_source=DEFAULT_DEM_PATH, cache=None, resampling="average"):
+    source = dem_source if isinstance(dem_source, DemSource) else DemSource(dem_source)
+    if downsample_factor == "auto":
+        downsample_factor = auto_downsample_factor(geo_model, max(source.res))
+    downsample_factor = int(downsample_factor)
+
+    key = None
+    if cache is not None:
+        tiles = source.intersecting(x_min, x_max, y_min, y_max)
+        key = cache.key([t["path"] for t in tiles],
+                        bounds=[x_min, x_max, y_min, y_max],
+                        downsample_factor=downsample_factor,
+                        resampling=resampling,
+                        nodata_fill=z_min)
+        hit = cache.get(key)
+        if hit is not None:
+            band1, transform = hit
+            print(f"Setting topography from cache ({key}), downsample factor {downsample_factor}")
+            set_topography_from_array(geo_model.grid, band1, transform)
+            return
 
-        # ✅ Downsampling
+    if resampling == "stride":
+        # Vanha tapa: koko resoluutio luetaan ja joka n:s pikseli valitaan
+        band1, transform, nodata = source.read(x_min, x_max, y_min, y_max)
         if downsample_factor > 1:
             band1 = band1[::downsample_factor, ::downsample_factor]
             transform = Affine(
                 transform.a * downsample_factor, transform.b, transform.c,
                 transform.d, transform.e * downsample_factor, transform.f
             )
+    else:
+        # Luetaan suoraan kohderesoluutiolla (average/bilinear/...)
+        band1, transform, nodata = source.read(x_min, x_max, y_min, y_max,
+                                               factor=downsample_factor, resampling=resampling)
+
+    # Korvaa nodata-arvot
+    if nodata is not None:
+        band1[band1 == nodata] = z_min
+
+    if cache is not None:
+        cache.put(key, band1, transform, crs=source.crs)
 
-        profile = src.profile
-        profile.update({
-            'height': band1.shape[0],
-            'width': band1.shape[1],
-            'transform': transform,
-            'nodata': z_min
-        })
-
-        with rasterio.open(output_path, 'w', **profile) as dst:
-            dst.write(band1, 1)
-
-    print(f"Setting topography with crop and downsample factor {downsample_factor}")
-    gp.set_topography_from_file(
-        grid=geo_model.grid,
-        filepath=output_path
-    )
+    print(f"Setting topography with crop and downsample factor {downsample_factor} ({resampling})")
+    set_topography_from_array(geo_model.grid, band1, transform)
@@ -1,9 +1,12 @@
 import csv
 import math
 import numpy as np
+from scipy.spatial import cKDTree
+
+ORIENTATION_MODES = ("centroid", "grid", "knn")
 
 def best_fit_plane(points):
-    pts = np.array(points)
+    pts = np.asarray(points, dtype=np.float64)
     centroid = pts.mean(axis=0)
     A = pts - centroid
     _, _, Vt = np.linalg.svd(A)
@@ -39,7 +42,143 @@ known_orientations = {
     'Ki': (175,0),
 }
 
-def create_orientation_file(points_by_formation, output_file):
+def strike_dip_from_normals(normals):
+    """
+    Kulku ja kaade paikallisille tasoille: normals (n, 3) -> (strike, dip).
+    Poikkeaa compute_strike_dip_from_normal-funktiosta (centroid-tila, jonka
+    tulos pidetään ennallaan): kaade on normaalin kulma pystysuunnasta
+    (vaakataso = 0°), ja kulku lasketaan ylöspäin suunnatusta normaalista.
+    """
+    horizontal = np.hypot(normals[:, 0], normals[:, 1])
+    flat = horizontal < 1e-12
+    dip = np.degrees(np.arctan2(horizontal, np.abs(normals[:, 2])))
+    up = np.where(normals[:, 2] < 0, -1.0, 1.0)
+    strike = np.degrees(np.arctan2(normals[:, 0] * up, normals[:, 1] * up)) % 360.0
+    return np.where(flat, 0.0, strike), dip
+
+
+def batched_plane_fit(neighbourhoods, weights):
+    """
+    Sovittaa tason jokaiseen naapurustoon yhdellä np.linalg.svd-kutsulla.
+    neighbourhoods (m, k, 3), weights (m, k) 0/1 (täytepisteillä 0).
+    Palauttaa painopisteet (m, 3), ylöspäin suunnatut yksikkönormaalit (m, 3)
+    ja tasomaisuuden (pienin / keskimmäinen singulaariarvo, 0 = täysin taso).
+    """
+    w = weights[..., None]
+    count = np.maximum(w.sum(axis=1), 1.0)
+    centroids = (neighbourhoods * w).sum(axis=1) / count
+    centered = (neighbourhoods - centroids[:, None, :]) * w
+    _, sv, vt = np.linalg.svd(centered, full_matrices=False)
+    normals = vt[:, -1, :]
+    normals = normals * np.where(normals[:, 2] < 0, -1.0, 1.0)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        flatness = np.where(sv[:, 1] > 1e-9, sv[:, 2] / sv[:, 1], np.inf)
+    return centroids, normals, flatness
+
+
+def ransac_inliers(neighbourhoods, valid, threshold, iterations=32, rng=None):
+    """
+    Vektoroitu RANSAC: jokaiselle naapurustolle arvotaan iterations kolmen
+    pisteen tasoa kerralla, ja valitaan taso, jonka etäisyysrajan
+    (threshold, m) sisään osuu eniten pisteitä. Palauttaa inlier-maskin (m, k).
+    """
+    rng = rng or np.random.default_rng(0)
+    m, k, _ = neighbourhoods.shape
+    counts = valid.sum(axis=1)
+    picks = np.floor(rng.random((m, iterations, 3)) * counts[:, None, None]).astype(np.int64)
+    rows = np.arange(m)[:, None, None]
+    p0, p1, p2 = (neighbourhoods[rows[..., 0], picks[..., i]] for i in range(3))
+    normals = np.cross(p1 - p0, p2 - p0)
+    length = np.linalg.norm(normals, axis=-1)
+    normals /= np.where(length > 1e-9, length, 1.0)[..., None]
+
+    # Etäisyydet (m, iterations, k); rappeutuneet kolmikot eivät voita
+    dist = np.abs(np.einsum("mik,mjk->mij", normals, neighbourhoods)
+                  - np.einsum("mik,mik->mi", normals, p0)[..., None])
+    score = ((dist <= threshold) & valid[:, None, :]).sum(axis=2)
+    score[length <= 1e-9] = -1
+    best = score.argmax(axis=1)
+    inliers = dist[np.arange(m), best] <= threshold
+    # Jos yksikään kolmikko ei kelpaa, pidetään kaikki pisteet
+    inliers[score.max(axis=1) < 0] = True
+    return inliers & valid
+
+
+def _grid_neighbourhoods(pts, cell_size, max_points, rng):
+    # Pisteet XY-ruuduittain (m, max_points, 3); täyttöpisteet maskataan
+    cell = np.floor(pts[:, :2] / cell_size).astype(np.int64)
+    order = np.lexsort((rng.random(len(pts)), cell[:, 1], cell[:, 0]))
+    cell_sorted = cell[order]
+    start = np.ones(len(order), dtype=bool)
+    start[1:] = np.any(cell_sorted[1:] != cell_sorted[:-1], axis=1)
+    group = np.cumsum(start) - 1
+    rank = np.arange(len(order)) - np.flatnonzero(start)[group]
+    keep = rank < max_points
+    neighbourhoods = np.zeros((group[-1] + 1, max_points, 3))
+    valid = np.zeros((group[-1] + 1, max_points), dtype=bool)
+    neighbourhoods[group[keep], rank[keep]] = pts[order[keep]]
+    valid[group[keep], rank[keep]] = True
+    # Täyttöpisteiksi ryhmän ensimmäinen piste, jotta SVD:n syöte on äärellinen
+    first = neighbourhoods[:, :1, :]
+    neighbourhoods = np.where(valid[..., None], neighbourhoods, first)
+    return neighbourhoods, valid
+
+
+def _knn_neighbourhoods(pts, k, max_orientations, rng):
+    k = min(k, len(pts))
+    seeds = pts
+    if max_orientations and len(pts) > max_orientations:
+        seeds = pts[np.sort(rng.choice(len(pts), max_orientations, replace=False))]
+    # Naapurit vain XY-tasossa: saman kairauksen eri syvyyksiä ei haeta
+    _, idx = cKDTree(pts[:, :2]).query(seeds[:, :2], k=k)
+    idx = idx.reshape(len(seeds), k)
+    return pts[idx], np.ones(idx.shape, dtype=bool)
+
+
+def local_orientations(points, mode="knn", cell_size=50.0, k=12, min_points=5,
+                       ransac_threshold=1.0, ransac_iterations=32, max_flatness=0.5,
+                       max_orientations=None, chunk_size=4096, seed=0):
+    """
+    Paikalliset orientaatiot yhdelle muodostumalle: naapurustot joko
+    XY-ruuduittain (mode="grid", cell_size) tai k lähimmän naapurin
+    ryhminä (mode="knn"). Naapurustot sovitetaan erissä batched_plane_fit-
+    funktiolla RANSAC-poikkeamien poiston jälkeen; liian vähän inliereitä tai
+    selvästi epätasomaiset naapurustot hylätään. Palauttaa (centroids, normals).
+    """
+    pts = np.asarray(points, dtype=np.float64)
+    if len(pts) < max(3, min_points):
+        return np.empty((0, 3)), np.empty((0, 3))
+    rng = np.random.default_rng(seed)
+    if mode == "grid":
+        neighbourhoods, valid = _grid_neighbourhoods(pts, cell_size, max(k, min_points), rng)
+    else:
+        neighbourhoods, valid = _knn_neighbourhoods(pts, k, max_orientations, rng)
+
+    centroids, normals = [], []
+    for lo in range(0, len(neighbourhoods), chunk_size):
+        nb, ok = neighbourhoods[lo:lo + chunk_size], valid[lo:lo + chunk_size]
+        ok = ok & (ok.sum(axis=1) >= min_points)[:, None]
+        if ransac_threshold:
+            ok = ransac_inliers(nb, ok, ransac_threshold, ransac_iterations, rng)
+        c, n, flatness = batched_plane_fit(nb, ok.astype(np.float64))
+        good = (ok.sum(axis=1) >= min_points) & (flatness <= max_flatness)
+        centroids.append(c[good])
+        normals.append(n[good])
+    return np.concatenate(centroids), np.concatenate(normals)
+
+
+def create_orientation_file(points_by_formation, output_file, orientations=None):
+    """
+    Kirjoittaa GemPy-orientaatiot. Oletuksena (mode="centroid") yksi
+    orientaatio muodostumaa kohden. config.json-asetuksella "orientations":
+    {"mode": "grid" | "knn", ...} muodostumille lasketaan paikalliset
+    orientaatiot (ks. local_orientations); muodostuma, jolle yhtään ei
+    synny, saa edelleen painopisteorientaationsa.
+    """
+    orientations = dict(orientations or {})
+    mode = orientations.pop("mode", None) or "centroid"
+    if mode not in ORIENTATION_MODES:
+        raise ValueError(f"Unknown orientation mode '{mode}'; choose from {ORIENTATION_MODES}")
     polarity = 1
     with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
@@ -48,7 +187,16 @@ def create_orientation_file(points_by_formation, output_file):
         for formation, points in points_by_formation.items():
             if len(points) < 1:
                 continue
-            pts = np.array(points)
+            if mode != "centroid":
+                centroids, normals = local_orientations(points, mode=mode, **orientations)
+                if len(centroids):
+                    strike, dip = strike_dip_from_normals(normals)
+                    writer.writerows(zip(centroids[:, 0], centroids[:, 1], centroids[:, 2], strike, dip,
+                                         [polarity] * len(centroids), [formation] * len(centroids)))
+                    print(f"→ {formation}: {len(centroids)} local orientations ({mode})")
+                    continue
+
+            pts = np.asarray(points, dtype=np.float64)
             centroid = pts.mean(axis=0)
             Xc, Yc, Zc = centroid
 
@@ -0,0 +1,68 @@
+# utils/dem_stats.py
+from __future__ import annotations
+import math
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window, from_bounds
+
+DEFAULT_MAX_READ_MB = 256
+
+
+def bounds_window(src, x_min, x_max, y_min, y_max) -> Window | None:
+    """Kokonaislukuikkuna, joka kattaa alueen ja on rasterin sisällä (None jos ei leikkaa)."""
+    w = from_bounds(x_min, y_min, x_max, y_max, src.transform)
+    col0 = max(0, math.floor(w.col_off))
+    row0 = max(0, math.floor(w.row_off))
+    col1 = min(src.width, math.ceil(w.col_off + w.width))
+    row1 = min(src.height, math.ceil(w.row_off + w.height))
+    if col1 <= col0 or row1 <= row0:
+        return None
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def iter_window_blocks(src, window: Window, max_mb: float | None = DEFAULT_MAX_READ_MB, band: int = 1,
+                       extra_bytes_per_cell: int = 0):
+    """
+    Lukee ikkunan riviryhminä niin, ettei yksi luku ylitä max_mb megatavua.
+    extra_bytes_per_cell varaa kutsujan lohkokohtaisille aputaulukoille
+    (esim. maskit) tilaa samasta budjetista.
+    """
+    itemsize = np.dtype(src.dtypes[band - 1]).itemsize + extra_bytes_per_cell
+    row_bytes = max(1, int(window.width) * itemsize)
+    if max_mb:
+        rows_per_block = max(1, int(max_mb * 1024 * 1024) // row_bytes)
+    else:
+        rows_per_block = int(window.height)
+    row_end = int(window.row_off + window.height)
+    for row in range(int(window.row_off), row_end, rows_per_block):
+        h = min(rows_per_block, row_end - row)
+        yield src.read(band, window=Window(window.col_off, row, window.width, h))
+
+
+def dem_z_range(path, x_min, x_max, y_min, y_max,
+                max_mb: float | None = DEFAULT_MAX_READ_MB) -> tuple[float, float] | None:
+    """
+    Korkeusmallin min/max alueen sisältä ilman koko kaistan lukemista.
+    Ikkuna luetaan paloittain ja tilastot kootaan juoksevasti. Lohkon lisäksi
+    muistissa on kaksi bool-maskia (1 tavu/solu), joten lohkot mitoitetaan
+    niin, että lohko ja maskit mahtuvat yhdessä max_mb megatavuun.
+    Palauttaa None, jos alueella ei ole arvoja.
+    """
+    with rasterio.open(path) as src:
+        window = bounds_window(src, x_min, x_max, y_min, y_max)
+        if window is None:
+            return None
+        nodata = src.nodata
+        z_min, z_max = math.inf, -math.inf
+        for block in iter_window_blocks(src, window, max_mb, extra_bytes_per_cell=2):
+            info = np.finfo(block.dtype) if block.dtype.kind == "f" else np.iinfo(block.dtype)
+            valid = np.isfinite(block) if block.dtype.kind == "f" else np.ones(block.shape, dtype=bool)
+            if nodata is not None:
+                valid &= block != nodata
+            if valid.any():
+                z_min = min(z_min, float(np.min(block, where=valid, initial=info.max)))
+                z_max = max(z_max, float(np.max(block, where=valid, initial=info.min)))
+    if z_min > z_max:
+        return None
+    return z_min, z_max
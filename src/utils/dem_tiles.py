@@ -0,0 +1,154 @@
+# utils/dem_tiles.py
+from __future__ import annotations
+from pathlib import Path
+from xml.sax.saxutils import escape
+import math
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import Affine
+
+from utils.dem_stats import bounds_window, dem_z_range, DEFAULT_MAX_READ_MB
+
+DEFAULT_DEM_PATH = "aineiston_kasittely/input_data/korkeusmalliL3342CDEF.tif"
+DEM_SUFFIXES = (".tif", ".tiff")
+_GDAL_TYPES = {"uint8": "Byte", "int16": "Int16", "uint16": "UInt16", "int32": "Int32",
+               "uint32": "UInt32", "float32": "Float32", "float64": "Float64"}
+
+
+class DemSource:
+    """
+    Korkeusmallilähde: yksi GeoTIFF tai hakemisto karttalehtiä (esim. MML:n
+    2 m KM2 -lehdet). Hakemistosta luetaan vain tiedostojen otsaketiedot;
+    rasteridataa luetaan vasta read()-kutsussa ja vain aluetta leikkaavista
+    lehdistä.
+    """
+
+    def __init__(self, path=DEFAULT_DEM_PATH):
+        p = Path(path)
+        if p.is_dir():
+            files = sorted(f for f in p.iterdir() if f.is_file() and f.suffix.lower() in DEM_SUFFIXES)
+        elif p.is_file():
+            files = [p]
+        else:
+            raise FileNotFoundError(f"DEM source not found: {p}")
+
+        self.path = p
+        self.tiles = []
+        for f in files:
+            with rasterio.open(f) as src:
+                self.tiles.append({
+                    "path": str(f.resolve()),
+                    "bounds": tuple(src.bounds),
+                    "res": src.res,
+                    "nodata": src.nodata,
+                    "crs": src.crs,
+                    "dtype": src.dtypes[0],
+                    "shape": (src.height, src.width),
+                    "block_shape": src.block_shapes[0],
+                })
+        if not self.tiles:
+            raise FileNotFoundError(f"No DEM tiles ({', '.join(DEM_SUFFIXES)}) in {p}")
+
+    @property
+    def bounds(self):
+        """Kaikkien lehtien yhteinen ulkoraja (left, bottom, right, top)."""
+        b = np.array([t["bounds"] for t in self.tiles])
+        return float(b[:, 0].min()), float(b[:, 1].min()), float(b[:, 2].max()), float(b[:, 3].max())
+
+    @property
+    def res(self):
+        return min(t["res"][0] for t in self.tiles), min(t["res"][1] for t in self.tiles)
+
+    @property
+    def nodata(self):
+        return self.tiles[0]["nodata"]
+
+    @property
+    def crs(self):
+        return self.tiles[0]["crs"]
+
+    def intersecting(self, x_min, x_max, y_min, y_max):
+        return [t for t in self.tiles
+                if t["bounds"][0] < x_max and t["bounds"][2] > x_min
+                and t["bounds"][1] < y_max and t["bounds"][3] > y_min]
+
+    def _vrt_xml(self, tiles):
+        # Kevyt GDAL VRT -mosaiikki: vain viittaukset lehtiin, ei pikselidataa
+        res_x, res_y = tiles[0]["res"]
+        if any(t["res"] != (res_x, res_y) for t in tiles):
+            raise ValueError("DEM tiles with different resolutions cannot be mosaicked")
+        left = min(t["bounds"][0] for t in tiles)
+        right = max(t["bounds"][2] for t in tiles)
+        bottom = min(t["bounds"][1] for t in tiles)
+        top = max(t["bounds"][3] for t in tiles)
+        nodata = tiles[0]["nodata"]
+        dtype = _GDAL_TYPES[tiles[0]["dtype"]]
+        nodata_xml = f"<NODATA>{nodata}</NODATA>" if nodata is not None else ""
+
+        sources = []
+        for t in tiles:
+            h, w = t["shape"]
+            bh, bw = t["block_shape"]
+            x_off = round((t["bounds"][0] - left) / res_x)
+            y_off = round((top - t["bounds"][3]) / res_y)
+            sources.append(
+                f'<ComplexSource><SourceFilename relativeToVRT="0">{escape(t["path"])}</SourceFilename>'
+                f'<SourceBand>1</SourceBand>'
+                f'<SourceProperties RasterXSize="{w}" RasterYSize="{h}" DataType="{_GDAL_TYPES[t["dtype"]]}" '
+                f'BlockXSize="{bw}" BlockYSize="{bh}"/>'
+                f'<SrcRect xOff="0" yOff="0" xSize="{w}" ySize="{h}"/>'
+                f'<DstRect xOff="{x_off}" yOff="{y_off}" xSize="{w}" ySize="{h}"/>'
+                f'{nodata_xml}</ComplexSource>'
+            )
+        srs = f"<SRS>{escape(tiles[0]['crs'].to_wkt())}</SRS>" if tiles[0]["crs"] else ""
+        band_nodata = f"<NoDataValue>{nodata}</NoDataValue>" if nodata is not None else ""
+        return (
+            f'<VRTDataset rasterXSize="{round((right - left) / res_x)}" '
+            f'rasterYSize="{round((top - bottom) / res_y)}">{srs}'
+            f'<GeoTransform>{left}, {res_x}, 0, {top}, 0, {-res_y}</GeoTransform>'
+            f'<VRTRasterBand dataType="{dtype}" band="1">{band_nodata}{"".join(sources)}'
+            f'</VRTRasterBand></VRTDataset>'
+        )
+
+    def open(self, x_min, x_max, y_min, y_max):
+        """
+        Avaa aluetta leikkaavat lehdet yhtenä rasterio-datasettinä: yksi
+        lehti suoraan, useampi VRT-mosaiikkina (luetaan vasta tarvittaessa).
+        """
+        tiles = self.intersecting(x_min, x_max, y_min, y_max)
+        if not tiles:
+            raise ValueError(f"No DEM tiles intersect extent "
+                             f"({x_min}, {x_max}, {y_min}, {y_max}) in {self.path}")
+        if len(tiles) == 1:
+            return rasterio.open(tiles[0]["path"])
+        print(f"→ Mosaicking {len(tiles)} DEM tiles for the model extent (VRT)")
+        return rasterio.open(self._vrt_xml(tiles))
+
+    def read(self, x_min, x_max, y_min, y_max, factor: int = 1, resampling: str = "average"):
+        """
+        Lukee alueen yhdeksi taulukoksi. Palauttaa (band, transform, nodata).
+        factor > 1 lukee harvennetun rasterin suoraan (out_shape), jolloin
+        GDAL lukee vain tarvittavat pikselit tai käyttää yleiskuvia.
+        """
+        with self.open(x_min, x_max, y_min, y_max) as src:
+            window = bounds_window(src, x_min, x_max, y_min, y_max)
+            transform = src.window_transform(window)
+            if factor <= 1:
+                return src.read(1, window=window), transform, src.nodata
+            out_h = max(1, math.ceil(window.height / factor))
+            out_w = max(1, math.ceil(window.width / factor))
+            band = src.read(1, window=window, out_shape=(out_h, out_w),
+                            resampling=Resampling[resampling])
+            transform = transform * Affine.scale(window.width / out_w, window.height / out_h)
+            return band, transform, src.nodata
+
+    def z_range(self, x_min, x_max, y_min, y_max, max_mb: float | None = DEFAULT_MAX_READ_MB):
+        """Min/max alueelta; jokainen leikkaava lehti luetaan paloittain (ks. dem_z_range)."""
+        ranges = [dem_z_range(t["path"], x_min, x_max, y_min, y_max, max_mb=max_mb)
+                  for t in self.intersecting(x_min, x_max, y_min, y_max)]
+        ranges = [r for r in ranges if r]
+        if not ranges:
+            return None
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
@@ -0,0 +1,168 @@
+# utils/point_index.py
+from __future__ import annotations
+from pathlib import Path
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+POINT_DTYPE = np.dtype([("x", "f8"), ("y", "f8"), ("z", "f8"), ("row", "i8")])
+DEFAULT_TILE_SIZE = 250.0
+CHUNKSIZE = 1_000_000
+
+
+def _sidecar_paths(csv_path: Path) -> tuple[Path, Path]:
+    return (csv_path.with_name(csv_path.name + ".pidx.npy"),
+            csv_path.with_name(csv_path.name + ".pidx.json"))
+
+
+def _source_stamp(csv_path: Path) -> dict:
+    st = csv_path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _xyz_columns(csv_path: Path) -> dict:
+    # Sarakenimissä voi olla välilyöntejä (vrt. df.columns.str.strip())
+    header = pd.read_csv(csv_path, nrows=0).columns
+    names = {c.strip(): c for c in header}
+    return {names[k]: k for k in ("X", "Y", "Z")}
+
+
+def _iter_chunks(csv_path: Path, columns: dict, chunksize: int):
+    # Palauttaa (rivinumerot, pala); pisteet ilman X/Y-arvoa jätetään pois
+    row0 = 0
+    for chunk in pd.read_csv(csv_path, usecols=list(columns), chunksize=chunksize):
+        chunk = chunk.rename(columns=columns)
+        rows = np.arange(row0, row0 + len(chunk), dtype=np.int64)
+        row0 += len(chunk)
+        valid = chunk["X"].notna().to_numpy() & chunk["Y"].notna().to_numpy()
+        yield rows[valid], chunk[valid]
+
+
+def build_point_index(csv_path, tile_size: float = DEFAULT_TILE_SIZE,
+                      chunksize: int = CHUNKSIZE) -> dict:
+    """
+    Rakentaa pistetiedostolle (X, Y, Z -sarakkeet) ruudukkoindeksin:
+    pisteet tallennetaan ruuduittain järjestettyyn .pidx.npy-tiedostoon ja
+    ruutujen alut/määrät .pidx.json-tiedostoon. CSV luetaan kahdesti
+    paloina, joten muistia ei kulu koko tiedoston verran.
+    """
+    csv_path = Path(csv_path)
+    npy_path, meta_path = _sidecar_paths(csv_path)
+    columns = _xyz_columns(csv_path)
+
+    # 1) Ruutujen pisteiden määrät ja origo
+    x0 = y0 = math.inf
+    for _, chunk in _iter_chunks(csv_path, columns, chunksize):
+        if len(chunk):
+            x0 = min(x0, float(chunk["X"].min()))
+            y0 = min(y0, float(chunk["Y"].min()))
+    if not math.isfinite(x0):
+        x0 = y0 = 0.0
+    x0 = math.floor(x0 / tile_size) * tile_size
+    y0 = math.floor(y0 / tile_size) * tile_size
+
+    def tile_keys(chunk):
+        ix = np.floor((chunk["X"].to_numpy(dtype=np.float64) - x0) / tile_size).astype(np.int64)
+        iy = np.floor((chunk["Y"].to_numpy(dtype=np.float64) - y0) / tile_size).astype(np.int64)
+        return ix, iy
+
+    counts: dict[tuple[int, int], int] = {}
+    for _, chunk in _iter_chunks(csv_path, columns, chunksize):
+        keys, n = np.unique(np.stack(tile_keys(chunk), axis=1), axis=0, return_counts=True)
+        for (ix, iy), c in zip(keys.tolist(), n.tolist()):
+            counts[(ix, iy)] = counts.get((ix, iy), 0) + c
+
+    # 2) Pisteet ruutujen kohdalle muistikarttaan
+    tiles = {}
+    cursor = {}
+    start = 0
+    for key in sorted(counts):
+        tiles[f"{key[0]},{key[1]}"] = [start, counts[key]]
+        cursor[key] = start
+        start += counts[key]
+
+    tmp_npy = npy_path.with_name(npy_path.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype=POINT_DTYPE, shape=(start,))
+    for rows, chunk in _iter_chunks(csv_path, columns, chunksize):
+        ix, iy = tile_keys(chunk)
+        order = np.lexsort((iy, ix))
+        rec = np.empty(len(chunk), dtype=POINT_DTYPE)
+        rec["x"] = chunk["X"].to_numpy(dtype=np.float64)[order]
+        rec["y"] = chunk["Y"].to_numpy(dtype=np.float64)[order]
+        rec["z"] = chunk["Z"].to_numpy(dtype=np.float64)[order]
+        rec["row"] = rows[order]
+        keys, first, n = np.unique(np.stack((ix[order], iy[order]), axis=1), axis=0,
+                                   return_index=True, return_counts=True)
+        for (kx, ky), i0, c in zip(keys.tolist(), first.tolist(), n.tolist()):
+            pos = cursor[(kx, ky)]
+            out[pos:pos + c] = rec[i0:i0 + c]
+            cursor[(kx, ky)] = pos + c
+    out.flush()
+    del out
+    os.replace(tmp_npy, npy_path)
+
+    meta = {"source": _source_stamp(csv_path), "tile_size": tile_size,
+            "origin": [x0, y0], "n_points": start, "tiles": tiles}
+    tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+    tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_meta, meta_path)
+    print(f"→ Built spatial index for {csv_path.name}: {start} points, {len(tiles)} tiles")
+    return meta
+
+
+def load_point_index(csv_path, tile_size: float = DEFAULT_TILE_SIZE):
+    """Palauttaa (meta, memmap). Indeksi rakennetaan uudelleen, jos CSV on muuttunut."""
+    csv_path = Path(csv_path)
+    if not csv_path.is_file():
+        raise FileNotFoundError(csv_path)
+    npy_path, meta_path = _sidecar_paths(csv_path)
+
+    meta = None
+    if meta_path.is_file() and npy_path.is_file():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except ValueError:
+            meta = None
+    if meta is None or meta.get("source") != _source_stamp(csv_path) \
+            or meta.get("tile_size") != tile_size:
+        meta = build_point_index(csv_path, tile_size=tile_size)
+    return meta, np.load(npy_path, mmap_mode="r")
+
+
+def query_bbox(csv_path, x_min, x_max, y_min, y_max, buffer: float = 0.0,
+               tile_size: float = DEFAULT_TILE_SIZE) -> pd.DataFrame:
+    """
+    Pisteet suorakaiteen (+ puskurin) sisältä. Vain leikkaavat ruudut
+    luetaan. Palauttaa DataFrame[X, Y, Z], jonka indeksi on pisteen
+    rivinumero CSV:ssä (kuten pd.read_csv-indeksi), rivijärjestyksessä.
+    """
+    meta, points = load_point_index(csv_path, tile_size)
+    x_min, x_max = x_min - buffer, x_max + buffer
+    y_min, y_max = y_min - buffer, y_max + buffer
+    ts = meta["tile_size"]
+    x0, y0 = meta["origin"]
+
+    ix0, ix1 = math.floor((x_min - x0) / ts), math.floor((x_max - x0) / ts)
+    iy0, iy1 = math.floor((y_min - y0) / ts), math.floor((y_max - y0) / ts)
+    tiles = meta["tiles"]
+    parts = []
+    if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) <= len(tiles):
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                span = tiles.get(f"{ix},{iy}")
+                if span:
+                    parts.append(points[span[0]:span[0] + span[1]])
+    else:
+        for key, (start, count) in tiles.items():
+            ix, iy = map(int, key.split(","))
+            if ix0 <= ix <= ix1 and iy0 <= iy <= iy1:
+                parts.append(points[start:start + count])
+
+    sel = np.concatenate(parts) if parts else np.empty(0, dtype=POINT_DTYPE)
+    mask = (sel["x"] >= x_min) & (sel["x"] <= x_max) & (sel["y"] >= y_min) & (sel["y"] <= y_max)
+    sel = np.sort(sel[mask], order="row")
+    return pd.DataFrame({"X": sel["x"], "Y": sel["y"], "Z": sel["z"]},
+                        index=pd.Index(sel["row"], name=None))
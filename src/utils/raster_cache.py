@@ -0,0 +1,98 @@
+# utils/raster_cache.py
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import os
+
+import rasterio
+
+DEFAULT_CACHE_DIR = "aineiston_kasittely/cache/topography"
+DEFAULT_BUDGET_MB = 512
+
+
+class RasterCache:
+    """
+    Sisältöosoitteinen välimuisti rajatuille/harvennetuille rastereille.
+    Avain muodostetaan lähdetiedostojen tiivisteestä ja käsittelyparametreista;
+    vanhimmin käytetyt tiedostot poistetaan, kun levybudjetti ylittyy.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, budget_mb: float = DEFAULT_BUDGET_MB):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._digest_path = self.dir / "digests.json"
+
+    def file_digest(self, path) -> str:
+        # Tiiviste lasketaan uudelleen vain, jos tiedoston koko tai mtime muuttuu
+        path = Path(path).resolve()
+        st = path.stat()
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        try:
+            digests = json.loads(self._digest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            digests = {}
+        cached = digests.get(str(path))
+        if cached and cached["stamp"] == stamp:
+            return cached["sha256"]
+
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+                h.update(chunk)
+        digests[str(path)] = {"stamp": stamp, "sha256": h.hexdigest()}
+        tmp = self._digest_path.with_name(self._digest_path.name + ".tmp")
+        tmp.write_text(json.dumps(digests, indent=1), encoding="utf-8")
+        os.replace(tmp, self._digest_path)
+        return h.hexdigest()
+
+    def key(self, source_paths, **params) -> str:
+        sources = sorted(self.file_digest(p) for p in source_paths)
+        payload = json.dumps({"sources": sources, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{key}.tif"
+
+    def get(self, key: str):
+        """Palauttaa (band, transform) tai None. Osuma päivittää käyttöajan (LRU)."""
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        with rasterio.open(path) as src:
+            band = src.read(1)
+            transform = src.transform
+        os.utime(path)
+        return band, transform
+
+    def put(self, key: str, band, transform, crs=None) -> Path:
+        path = self._path(key)
+        tmp = path.with_name(path.stem + ".tmp.tif")
+        with rasterio.open(
+            tmp, "w",
+            driver="GTiff",
+            height=band.shape[0],
+            width=band.shape[1],
+            count=1,
+            dtype=band.dtype,
+            crs=crs,
+            transform=transform,
+            compress="deflate",
+        ) as dst:
+            dst.write(band, 1)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path | None = None):
+        entries = sorted(self.dir.glob("*.tif"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        for p in entries:
+            if total <= self.budget_bytes:
+                break
+            if keep is not None and p == keep:
+                continue
+            total -= p.stat().st_size
+            p.unlink()
+            print(f"→ Evicted cached raster {p.name}")
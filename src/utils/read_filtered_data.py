@@ -1,22 +1,26 @@
-import csv
-import math
 import numpy as np
+import pandas as pd
 
-def read_filtered_data(filename):
-    points_by_formation = {}
-    with open(filename, 'r', newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            formation = row['formation']
-            try:
-                X = float(row['X'])
-                Y = float(row['Y'])
-                Z = float(row['Z'])
-            except ValueError:
-                continue
-            if any(math.isnan(v) for v in [X, Y, Z]):
-                continue
-            if formation not in points_by_formation:
-                points_by_formation[formation] = []
-            points_by_formation[formation].append((X, Y, Z))
-    return points_by_formation
+def read_filtered_data(source):
+    """
+    Pintapisteet muodostumittain: {formation: (N, 3) float64 -taulukko X, Y, Z}.
+    source on CSV-tiedoston polku tai valmis DataFrame (esim. main():n
+    df_offset). Rivit, joiden koordinaatti puuttuu tai ei ole luku, ohitetaan.
+    Taulukot ovat näkymiä yhteen muodostumittain järjestettyyn taulukkoon;
+    muodostumien ja niiden pisteiden järjestys säilyy.
+    """
+    if isinstance(source, pd.DataFrame):
+        df = source[['X', 'Y', 'Z', 'formation']]
+    else:
+        df = pd.read_csv(source, usecols=['X', 'Y', 'Z', 'formation'], dtype={'formation': str},
+                         float_precision='round_trip')
+
+    xyz = np.column_stack([pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=np.float64)
+                           for c in ('X', 'Y', 'Z')])
+    valid = ~np.isnan(xyz).any(axis=1)
+    codes, formations = pd.factorize(df['formation'].fillna('').to_numpy()[valid])
+
+    order = np.argsort(codes, kind='stable')
+    points = np.ascontiguousarray(xyz[valid][order])
+    bounds = np.searchsorted(codes[order], np.arange(len(formations) + 1))
+    return {formation: points[bounds[i]:bounds[i + 1]] for i, formation in enumerate(formations)}
@@ -0,0 +1,41 @@
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from data_processing.parse_tek import iter_boreholes
+from data_processing.borehole_store import BoreholeStore
+from main import build_offset_data
+
+INPUT_DIR = os.path.join(ROOT, "aineiston_kasittely", "input_data")
+OUTPUT_DIR = os.path.join(ROOT, "aineiston_kasittely", "output_data")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Alkuperäisen main.py:n (ennen vektorointia) tuottamat offset_data.csv-tiedostot
+GOLDEN = {
+    "Paltta": "offset_data_Paltta.csv",
+    "Verkakyla": "offset_data_Verkakyla.csv",
+}
+
+with open(os.path.join(ROOT, "aineiston_kasittely", "config_files", "config.json"), encoding="utf-8") as f:
+    CONFIG = json.load(f)
+
+
+@pytest.mark.parametrize("sample", sorted(GOLDEN))
+def test_offset_data_matches_original(sample, tmp_path):
+    tek_file, = glob.glob(os.path.join(INPUT_DIR, f"{sample}*.tek"))
+    store = BoreholeStore.from_records(iter_boreholes(tek_file))
+    config = {**CONFIG, "project_state_dir": None}
+
+    df_offset = build_offset_data(store, config, output_dir=OUTPUT_DIR)
+    out_path = tmp_path / "offset_data.csv"
+    df_offset.to_csv(out_path, index=False)
+
+    with open(os.path.join(DATA_DIR, GOLDEN[sample]), "rb") as f:
+        expected = f.read()
+    assert out_path.read_bytes() == expected
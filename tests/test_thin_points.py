@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import LinearNDInterpolator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from data_processing.thin_points import error_thin
+
+
+def max_error(df, kept):
+    """Suurin Z-poikkeama kaikissa pisteissä säilytettyjen pisteiden lineaarisesta interpolaatiosta."""
+    if len(kept) == len(df):
+        return 0.0
+    interp = LinearNDInterpolator(kept[['X', 'Y']].to_numpy(), kept['Z'].to_numpy())
+    err = np.abs(interp(df[['X', 'Y']].to_numpy()) - df['Z'].to_numpy())
+    return float(np.nanmax(np.where(np.isnan(err), np.inf, err)))
+
+
+def test_error_thin_small_cluster_stays_within_tolerance(capsys):
+    # Kaikki pisteet yhdessä karkeassa ruudussa -> lähtöotoksessa 1 piste
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'X': 1000.0 + rng.uniform(0, 5, 12), 'Y': 2000.0 + rng.uniform(0, 5, 12),
+                       'Z': rng.normal(50.0, 2.0, 12), 'formation': 'Mr'})
+
+    kept = error_thin(df, tolerance=0.1, cell_size=10.0)
+
+    assert max_error(df, kept) <= 0.1
+    assert "tolerance 0.1 m not reached" in capsys.readouterr().out
+
+
+def test_error_thin_clustered_formation_stays_within_tolerance():
+    # Kolme erillistä rypästä; taso + kohinaa
+    rng = np.random.default_rng(1)
+    centres = np.array([[0.0, 0.0], [200.0, 0.0], [100.0, 150.0]])
+    xy = np.concatenate([c + rng.uniform(0, 15, (40, 2)) for c in centres])
+    z = 0.05 * xy[:, 0] - 0.02 * xy[:, 1] + rng.normal(0, 0.3, len(xy))
+    df = pd.DataFrame({'X': xy[:, 0], 'Y': xy[:, 1], 'Z': z, 'formation': 'Sa'})
+
+    kept = error_thin(df, tolerance=0.5, cell_size=10.0, max_rounds=100)
+
+    assert len(kept) < len(df)
+    assert max_error(df, kept) <= 0.5